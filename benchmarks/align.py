@@ -0,0 +1,48 @@
+"""Measures the time of `align()` for lists of different lengths.
+
+* equal: both lists are equal
+* insert: one element is inserted in the middle
+* changes: 1% of the elements are replaced
+* matrix: the O(n*m) algorithm which was used before (only for n <= 1000)
+
+usage: python benchmarks/align.py
+"""
+
+import random
+import time
+
+from inline_snapshot._align import align
+from inline_snapshot._align import align_matrix
+
+
+def measure(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def run():
+    random.seed(0)
+    print(f"{'n':>7} {'equal':>10} {'insert':>10} {'changes':>10} {'matrix':>10}")
+
+    for n in (10, 100, 1_000, 10_000, 100_000):
+        seq_a = list(range(n))
+
+        inserted = seq_a[: n // 2] + [-1] + seq_a[n // 2 :]
+
+        changed = list(seq_a)
+        for i in random.sample(range(n), max(1, n // 100)):
+            changed[i] = -i - 1
+
+        times = [
+            measure(align, seq_a, list(seq_a)),
+            measure(align, seq_a, inserted),
+            measure(align, seq_a, changed),
+        ]
+        matrix = f"{measure(align_matrix, seq_a, changed):10.4f}" if n <= 1000 else ""
+
+        print(f"{n:7}", *(f"{t:10.4f}" for t in times), f"{matrix:>10}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,39 @@
+"""Measures repeated comparisons of a large value with the same snapshot,
+like it happens inside loops or parametrized tests.
+
+usage: python benchmarks/capture.py
+"""
+
+import time
+
+from inline_snapshot import _inline_snapshot
+from inline_snapshot import snapshot
+
+number = 20
+
+
+def large_value():
+    return [{"id": i, "tags": ["a", "b"], "point": (i, i + 1)} for i in range(100_000)]
+
+
+def compare(value):
+    for _ in range(number):
+        assert value == snapshot()
+
+
+def run():
+    _inline_snapshot._active = True
+
+    value = large_value()
+
+    start = time.perf_counter()
+    compare(value)
+    duration = time.perf_counter() - start
+    print(f"{number} comparisons: {duration:8.4f} s")
+
+    _inline_snapshot._active = False
+    _inline_snapshot.snapshots.clear()
+
+
+if __name__ == "__main__":
+    run()
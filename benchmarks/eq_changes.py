@@ -0,0 +1,75 @@
+"""Measures the time which is needed to compute the changes of a large
+nested `x == snapshot(...)`.
+
+* unchanged: the value is the same as in the source
+* one change: one leaf of the value is different
+
+usage: python benchmarks/eq_changes.py
+"""
+
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from inline_snapshot import _inline_snapshot
+from inline_snapshot._format import format_code
+
+
+def api_response(size):
+    random.seed(0)
+    return [
+        {
+            "id": i,
+            "name": f"user {i}",
+            "active": i % 3 == 0,
+            "score": random.random(),
+            "tags": ["a", "b", str(i)],
+            "address": {"street": f"street {i}", "zip": str(10000 + i), "no": i},
+        }
+        for i in range(size)
+    ]
+
+
+def measure(directory, name, value, changed_value):
+    filename = Path(directory) / f"test_{name}.py"
+    code = f"from inline_snapshot import snapshot\n\ndef run(value):\n    assert value == snapshot({value!r})\n"
+    filename.write_text(format_code(code, filename), "utf-8")
+
+    namespace: dict = {}
+    exec(compile(filename.read_text("utf-8"), filename, "exec"), namespace)
+
+    for label, v in [("unchanged", value), ("one change", changed_value)]:
+        _inline_snapshot.snapshots.clear()
+        try:
+            namespace["run"](v)
+        except AssertionError:
+            pass
+
+        (snapshot,) = _inline_snapshot.snapshots.values()
+
+        # the tokens of the file are only created once
+        snapshot._value._source.asttokens()
+
+        start = time.perf_counter()
+        changes = list(snapshot._value._get_changes())
+        duration = time.perf_counter() - start
+        print(f"{name:10} {label:12}: {duration:8.4f} s  ({len(changes)} changes)")
+
+
+def run():
+    _inline_snapshot._active = True
+
+    with tempfile.TemporaryDirectory() as directory:
+        for size in (100, 1000, 5000):
+            value = api_response(size)
+            changed_value = api_response(size)
+            changed_value[size // 2]["address"]["no"] = -1
+            measure(directory, f"n={size}", value, changed_value)
+
+    _inline_snapshot._active = False
+    _inline_snapshot.snapshots.clear()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,36 @@
+"""Measures the time which is needed to outsource and load data with a
+storage which already contains many files.
+
+usage: python benchmarks/external_lookup.py
+"""
+
+import tempfile
+import time
+from pathlib import Path
+
+from inline_snapshot import _external
+from inline_snapshot import outsource
+
+
+def run():
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "external"
+        path.mkdir()
+        for i in range(20000):
+            (path / f"{i:064x}.txt").write_bytes(b"")
+
+        _external.storage = _external.DiscStorage(path)
+
+        start = time.perf_counter()
+        values = [outsource(f"value {i}") for i in range(1000)]
+        for value in values:
+            value._load_value()
+        duration = time.perf_counter() - start
+
+        print(f"outsource + load 1000 values: {duration:8.4f} s")
+
+        _external.storage = None
+
+
+if __name__ == "__main__":
+    run()
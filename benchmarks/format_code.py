@@ -0,0 +1,55 @@
+"""Compares the cost of one `format_code()` call with the old implementation,
+which invoked the black cli through click's CliRunner.
+
+usage: python benchmarks/format_code.py
+"""
+
+import tempfile
+import timeit
+import warnings
+from pathlib import Path
+
+from black import main
+from click.testing import CliRunner
+
+from inline_snapshot._format import format_code
+
+
+def cli_format_code(text, filename):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+
+        runner = CliRunner(mix_stderr=False)
+        result = runner.invoke(
+            main, ["--stdin-filename", str(filename), "-"], input=text
+        )
+
+    return result.stdout
+
+
+samples = {
+    "value": "[1,2,{'a':5,'b':[1,2,3]}]",
+    "file": "\n".join(
+        f"def test_{i}():\n    assert {i}==snapshot({i})\n" for i in range(200)
+    ),
+}
+
+
+def run():
+    with tempfile.TemporaryDirectory() as dir:
+        filename = Path(dir) / "test_something.py"
+
+        for name, text in samples.items():
+            assert format_code(text, filename) == cli_format_code(text, filename)
+
+            number = 200 if name == "value" else 10
+
+            for label, func in [("cli", cli_format_code), ("api", format_code)]:
+                t = min(
+                    timeit.repeat(lambda: func(text, filename), number=number, repeat=3)
+                )
+                print(f"{name:6} {label}: {t / number * 1e6:10.1f} us/call")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,55 @@
+"""Measures the overhead of the plugin for a test suite with many tests
+which do not use snapshots.
+
+The number of function calls is reported in addition to the time, because
+it is not influenced by the load of the machine.
+
+usage: python benchmarks/many_tests.py
+"""
+
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+profile = """\
+import cProfile, pstats, sys, pytest
+profiler = cProfile.Profile()
+profiler.enable()
+pytest.main(["-q", "-p", "no:cacheprovider", *sys.argv[1:]])
+profiler.disable()
+stats = pstats.Stats(profiler)
+print(stats.total_calls, stats.total_tt, file=sys.stderr)
+"""
+
+
+def run_pytest(directory, *args):
+    result = subprocess.run(
+        [sys.executable, "-c", profile, *args],
+        cwd=directory,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=True,
+    )
+    calls, duration = result.stderr.split()[-2:]
+    return int(calls), float(duration)
+
+
+def run(number=50000):
+    with tempfile.TemporaryDirectory() as directory:
+        tests = "".join(
+            f"def test_{i}():\n    assert {i} == {i}\n\n" for i in range(number)
+        )
+        (Path(directory) / "test_many.py").write_text(tests, "utf-8")
+
+        calls, duration = run_pytest(directory, "-p", "no:inline_snapshot")
+        plugin_calls, plugin_duration = run_pytest(directory)
+
+        print(f"{number} tests without inline-snapshot: {duration:8.2f} s")
+        print(f"{number} tests with inline-snapshot:    {plugin_duration:8.2f} s")
+        print(f"function calls per test:  {(plugin_calls - calls) / number:8.1f}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,40 @@
+"""Measures the time which is needed to add many replacements to one file,
+like the changes of a large list literal in a snapshot.
+
+usage: python benchmarks/replacements.py
+"""
+
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from inline_snapshot._rewrite_code import ChangeRecorder
+
+
+def run():
+    with tempfile.TemporaryDirectory() as directory:
+        for size in (1000, 5000, 20000):
+            filename = Path(directory) / f"test_{size}.py"
+            filename.write_text(
+                "x = [" + ", ".join(str(i) for i in range(size)) + "]\n", "utf-8"
+            )
+            code = filename.read_text("utf-8")
+
+            positions = [code.index(f" {i},") + 1 for i in range(1, size - 1)]
+            random.seed(0)
+            random.shuffle(positions)
+
+            recorder = ChangeRecorder()
+            start = time.perf_counter()
+            for position in positions:
+                recorder.change_set().replace(
+                    ((1, position), (1, position + 1)), "0", filename=filename
+                )
+            duration = time.perf_counter() - start
+
+            print(f"n={size:6}: {duration:8.4f} s  ({len(positions)} replacements)")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,82 @@
+"""Measures the time which is needed to report and apply the changes of
+many test files with snapshots in all categories.
+
+usage: python benchmarks/report_changes.py
+"""
+
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+test_file = """\
+from inline_snapshot import snapshot
+
+
+def test_create():
+    assert [1, 2, 3] == snapshot()
+
+
+def test_fix():
+    assert {"a": 1, "b": 2} == snapshot({"a": 1, "b": 3})
+
+
+def test_trim():
+    assert 5 in snapshot([1, 5, 7])
+
+
+def test_update():
+    assert 5 == snapshot(2 + 3)
+"""
+
+# counts the calls of the formatter
+conftest = """\
+from inline_snapshot import _rewrite_code
+
+calls = 0
+format_code = _rewrite_code.format_code
+
+
+def counting_format_code(*args, **kwargs):
+    global calls
+    calls += 1
+    return format_code(*args, **kwargs)
+
+
+_rewrite_code.format_code = counting_format_code
+
+
+def pytest_unconfigure(config):
+    print(f"format calls: {calls}")
+"""
+
+
+def run(number=800):
+    with tempfile.TemporaryDirectory() as directory:
+        for i in range(number):
+            (Path(directory) / f"test_{i}.py").write_text(test_file, "utf-8")
+        (Path(directory) / "conftest.py").write_text(conftest, "utf-8")
+
+        start = time.perf_counter()
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "pytest",
+                "-q",
+                "-p",
+                "no:cacheprovider",
+                "--inline-snapshot=create,fix,trim,update",
+            ],
+            cwd=directory,
+            capture_output=True,
+            text=True,
+        )
+        duration = time.perf_counter() - start
+
+        print(f"{number} files: {duration:8.2f} s, {result.stdout.splitlines()[-1]}")
+
+
+if __name__ == "__main__":
+    run()
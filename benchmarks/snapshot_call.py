@@ -0,0 +1,72 @@
+"""Measures the cost of one `snapshot()` call.
+
+* disabled: inline-snapshot is not active (`--inline-snapshot=disable`)
+* first-hit: the call site is seen for the first time and has to be analyzed
+  (the file is parsed by executing once for all calls)
+* repeat-hit: the same call site is called again (loops, parametrized tests)
+
+usage: python benchmarks/snapshot_call.py
+"""
+
+import linecache
+import tempfile
+import time
+from pathlib import Path
+
+from executing import Source
+
+from inline_snapshot import _inline_snapshot
+from inline_snapshot import snapshot
+
+number = 2000
+
+
+def repeat_hit():
+    for _ in range(number):
+        snapshot(5)
+
+
+def first_hit(directory):
+    filename = Path(directory) / "test_first_hit.py"
+    filename.write_text(
+        "from inline_snapshot import snapshot\n\ndef run():\n"
+        + "".join(f"    snapshot({i})\n" for i in range(number)),
+        "utf-8",
+    )
+    namespace: dict = {}
+    exec(compile(filename.read_text("utf-8"), filename, "exec"), namespace)
+
+    # the source and the nodes of the calls are not known yet
+    linecache.clearcache()
+    Source._class_local("__source_cache_with_lines", {}).clear()
+    Source._class_local("__executing_cache", {}).clear()
+    _inline_snapshot.snapshots.clear()
+
+    return namespace["run"]
+
+
+def measure(name, func):
+    start = time.perf_counter_ns()
+    func()
+    duration = time.perf_counter_ns() - start
+    print(f"{name:10}: {duration / number:10.0f} ns/call")
+
+
+def run():
+    _inline_snapshot._active = False
+    measure("disabled", repeat_hit)
+
+    _inline_snapshot._active = True
+    repeat_hit()
+    measure("repeat-hit", repeat_hit)
+
+    with tempfile.TemporaryDirectory() as directory:
+        func = first_hit(directory)
+        measure("first-hit", func)
+
+    _inline_snapshot._active = False
+    _inline_snapshot.snapshots.clear()
+
+
+if __name__ == "__main__":
+    run()
@@ -1,7 +1,8 @@
+from ._capture import register_freeze
 from ._external import external
 from ._external import outsource
 from ._inline_snapshot import snapshot
 
-__all__ = ["snapshot", "external", "outsource"]
+__all__ = ["snapshot", "external", "outsource", "register_freeze"]
 
 __version__ = "0.10.0"
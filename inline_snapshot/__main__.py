@@ -0,0 +1,106 @@
+from pathlib import Path
+
+import click
+
+from . import _config
+from . import _external
+from ._changeset import ChangeSetError
+from ._changeset import read_changesets
+from ._changeset import rewrite_files
+from ._rewrite_code import FileChangedError
+
+categories = ("create", "fix", "trim", "update")
+
+
+root_option = click.option(
+    "--root",
+    default=".",
+    type=click.Path(exists=True, file_okay=False, path_type=Path),
+    help="The root directory of the test run (the pytest rootdir).",
+)
+
+
+def setup(root: Path):
+    _config.config = _config.read_config(root / "pyproject.toml")
+    try:
+        _external.storage = _external.create_storage(
+            root / ".inline-snapshot/external",
+            _config.config.storage_layout,
+            _config.config.compression,
+        )
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+
+@click.group()
+def main():
+    """Tools for inline-snapshot."""
+
+
+@main.command()
+@click.argument(
+    "changesets",
+    nargs=-1,
+    required=True,
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+)
+@root_option
+@click.option(
+    "--flags",
+    default=",".join(categories),
+    help="The categories of the changes which should be applied.",
+)
+def apply(changesets, root, flags):
+    """Applies the changes which were recorded with
+    `pytest --inline-snapshot-record=CHANGESET`.
+
+    The snapshots of several change-sets (from test runs which were split
+    across several machines) are merged before the changes are applied.
+    """
+    flags = {flag for flag in flags.split(",") if flag}
+    if flags - set(categories):
+        raise click.UsageError(
+            f"unknown flags: {', '.join(sorted(flags - set(categories)))}"
+        )
+
+    root = root.resolve()
+    setup(root)
+
+    try:
+        changes = read_changesets(changesets, root, flags)
+        rewrite_files(changes)
+    except (ChangeSetError, FileChangedError) as e:
+        raise click.ClickException(str(e))
+    finally:
+        _external.storage.close()
+
+    click.echo(f"applied {len(changes)} changes")
+
+
+@main.command()
+@root_option
+@click.option(
+    "--layout",
+    type=click.Choice(_external.layouts),
+    help="The new layout. The default is the storage-layout of the configuration.",
+)
+def migrate_storage(root, layout):
+    """Moves the external data into the storage layout which is configured
+    with `storage-layout` in the pyproject.toml and compresses or
+    decompresses the files like it is configured with `compression`."""
+    root = root.resolve()
+    config = _config.read_config(root / "pyproject.toml")
+    layout = layout or config.storage_layout
+
+    try:
+        moved = _external.migrate_storage(
+            root / ".inline-snapshot/external", layout, config.compression
+        )
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    click.echo(f"moved {moved} files into the {layout} layout")
+
+
+if __name__ == "__main__":
+    main()
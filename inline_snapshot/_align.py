@@ -1,7 +1,61 @@
 from itertools import groupby
+from typing import List
+
+# sequences which are smaller than this (len(a) * len(b)) are aligned with the
+# full matrix, which produces the same results as previous versions
+max_matrix_size = 10_000
 
 
 def align(seq_a, seq_b) -> str:
+    """Aligns two sequences and returns the edit track.
+
+    The track contains one character for every step:
+
+    * `m`: the elements are equal
+    * `i`: an element of `seq_b` is inserted
+    * `d`: an element of `seq_a` is deleted
+    """
+    seq_a = list(seq_a)
+    seq_b = list(seq_b)
+
+    if seq_a == seq_b:
+        return "m" * len(seq_a)
+
+    # a common suffix is always matched
+    suffix = 0
+    while (
+        suffix < len(seq_a)
+        and suffix < len(seq_b)
+        and seq_a[-1 - suffix] == seq_b[-1 - suffix]
+    ):
+        suffix += 1
+
+    if suffix:
+        seq_a = seq_a[:-suffix]
+        seq_b = seq_b[:-suffix]
+
+    if len(seq_a) * len(seq_b) <= max_matrix_size:
+        return align_matrix(seq_a, seq_b) + "m" * suffix
+
+    prefix = 0
+    while (
+        prefix < len(seq_a) and prefix < len(seq_b) and seq_a[prefix] == seq_b[prefix]
+    ):
+        prefix += 1
+
+    seq_a = seq_a[prefix:]
+    seq_b = seq_b[prefix:]
+
+    # the reversed sequences are aligned to prefer the same matches as
+    # align_matrix, which searches the track from the end
+    track = align_myers(seq_a[::-1], seq_b[::-1])[::-1]
+
+    return "m" * prefix + deletions_first(track) + "m" * suffix
+
+
+def align_matrix(seq_a, seq_b) -> str:
+    """LCS alignment which needs O(len(seq_a) * len(seq_b)) time and
+    memory."""
 
     matrix: list = [[(0, "e")] + [(0, "i")] * len(seq_b)]
 
@@ -40,6 +94,175 @@ def align(seq_a, seq_b) -> str:
     return track[::-1]
 
 
+def element_keys(seq_a, seq_b):
+    """Maps equal hashable elements to the same integer and unhashable
+    elements to None."""
+    ids: dict = {}
+
+    def key(value):
+        try:
+            return ids.setdefault(value, len(ids))
+        except TypeError:
+            return None
+
+    return [key(a) for a in seq_a], [key(b) for b in seq_b]
+
+
+def align_myers(seq_a, seq_b) -> str:
+    """Myers' O(ND) alignment in linear space, where D is the number of
+    edits.
+
+    The middle snake of the optimal path is searched from both ends and the
+    parts before and after it are aligned recursively (like Hirschberg's
+    algorithm), which needs O(N + M) memory.
+    """
+    keys_a, keys_b = element_keys(seq_a, seq_b)
+
+    # elements which are not in the other sequence can never be matched. They
+    # are removed before the alignment, which keeps D small if most of the
+    # elements are different. Unhashable elements (key None, like dirty-equals
+    # objects) can be equal to every element of the other sequence.
+    known_a = set(keys_a)
+    known_b = set(keys_b)
+    index_a = [
+        i
+        for i, key in enumerate(keys_a)
+        if key is None or None in known_b or key in known_b
+    ]
+    index_b = [
+        i
+        for i, key in enumerate(keys_b)
+        if key is None or None in known_a or key in known_a
+    ]
+
+    def equal(x, y):
+        key_a = keys_a[index_a[x]]
+        key_b = keys_b[index_b[y]]
+        if key_a is not None and key_b is not None:
+            return key_a == key_b
+        return seq_a[index_a[x]] == seq_b[index_b[y]]
+
+    steps: List[str] = []
+    _myers_align(equal, 0, len(index_a), 0, len(index_b), steps)
+
+    # the removed elements are deleted/inserted at their positions
+    track = []
+    x = y = 0
+    a = b = 0
+    for step in "".join(steps):
+        if step != "i":
+            track.append("d" * (index_a[x] - a))
+            a = index_a[x] + 1
+            x += 1
+        if step != "d":
+            track.append("i" * (index_b[y] - b))
+            b = index_b[y] + 1
+            y += 1
+        track.append(step)
+
+    track.append("d" * (len(seq_a) - a))
+    track.append("i" * (len(seq_b) - b))
+
+    return "".join(track)
+
+
+def _myers_align(equal, a0, a1, b0, b1, track: List[str]):
+    """Appends the edit track of seq_a[a0:a1] and seq_b[b0:b1] to
+    `track`."""
+    n = a1 - a0
+    m = b1 - b0
+
+    if n == 0 or m == 0:
+        track.append("d" * n + "i" * m)
+        return
+
+    d, (x, y), (u, v) = _middle_snake(equal, a0, a1, b0, b1)
+
+    if d > 1:
+        _myers_align(equal, a0, x, b0, y, track)
+        track.append("m" * (u - x))
+        _myers_align(equal, u, a1, v, b1, track)
+        return
+
+    # at most one element is inserted or deleted
+    common = min(n, m)
+    prefix = 0
+    while prefix < common and equal(a0 + prefix, b0 + prefix):
+        prefix += 1
+
+    track.append("m" * prefix + "d" * (n - common) + "i" * (m - common))
+    track.append("m" * (common - prefix))
+
+
+def _middle_snake(equal, a0, a1, b0, b1):
+    """Returns the number of edits and the start and end of the snake in the
+    middle of the optimal path from (a0, b0) to (a1, b1).
+
+    The furthest reaching paths are searched from both ends at the same
+    time until they overlap. Only the current end points of the paths are
+    stored.
+    """
+    n = a1 - a0
+    m = b1 - b0
+    delta = n - m
+    odd = delta % 2 != 0
+
+    # forward[k] is the furthest x which is reached on the diagonal k=x-y,
+    # backward[k] the same from the end of both sequences
+    forward = {1: 0}
+    backward = {1: 0}
+
+    for d in range((n + m + 1) // 2 + 1):
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and forward[k - 1] < forward[k + 1]):
+                x = forward[k + 1]
+            else:
+                x = forward[k - 1] + 1
+            y = x - k
+            start_x, start_y = x, y
+
+            while x < n and y < m and equal(a0 + x, b0 + y):
+                x += 1
+                y += 1
+
+            forward[k] = x
+
+            if odd and delta - d < k < delta + d and x + backward[delta - k] >= n:
+                return 2 * d - 1, (a0 + start_x, b0 + start_y), (a0 + x, b0 + y)
+
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and backward[k - 1] < backward[k + 1]):
+                x = backward[k + 1]
+            else:
+                x = backward[k - 1] + 1
+            y = x - k
+            start_x, start_y = x, y
+
+            while x < n and y < m and equal(a1 - 1 - x, b1 - 1 - y):
+                x += 1
+                y += 1
+
+            backward[k] = x
+
+            if not odd and -d <= delta - k <= d and x + forward[delta - k] >= n:
+                return 2 * d, (a1 - x, b1 - y), (a1 - start_x, b1 - start_y)
+
+    assert False, "the paths always overlap"
+
+
+def deletions_first(track):
+    """Moves the deletions in front of the insertions between two
+    matches."""
+    result = ""
+    for is_match, group in groupby(track, lambda c: c == "m"):
+        steps = "".join(group)
+        if is_match:
+            result += steps
+        else:
+            result += "d" * steps.count("d") + "i" * steps.count("i")
+    return result
+
+
 def add_x(track):
     """Replaces an `id` with the same number of insertions and deletions with
     x."""
@@ -0,0 +1,74 @@
+import copy
+import functools
+from typing import Any
+from typing import Callable
+
+# types which can not be changed after they are created
+immutable_types = {
+    int,
+    float,
+    complex,
+    bool,
+    str,
+    bytes,
+    range,
+    type(None),
+    type(Ellipsis),
+}
+
+
+@functools.singledispatch
+def _freeze(value):
+    return copy.deepcopy(value)
+
+
+def register_freeze(cls: type, freeze: Callable[[Any], Any]):
+    """Registers the function which creates a copy of an instance of `cls`
+    (or of one of its subclasses), which is used instead of
+    `copy.deepcopy()`.
+
+    Snapshots store a copy of the values they are compared with, because the
+    values could be changed later by the test.
+    `freeze` can return the value itself if it is immutable or create a
+    cheaper copy.
+
+    ``` python
+    from inline_snapshot import register_freeze
+
+
+    class Token:
+        # tokens can not be changed after they are created
+        ...
+
+
+    register_freeze(Token, lambda token: token)
+    ```
+    """
+    _freeze.register(cls, freeze)
+
+
+def is_immutable(value) -> bool:
+    """Returns True if `value` and all values which it contains can not be
+    changed."""
+    value_type = type(value)
+
+    if value_type in immutable_types:
+        return True
+
+    if value_type is tuple or value_type is frozenset:
+        return all(is_immutable(v) for v in value)
+
+    return False
+
+
+def freeze(value):
+    """Returns a copy of `value`, which is not changed when `value` is changed
+    later.
+
+    Snapshots store the values they are compared with and should only call
+    this for values which are actually stored.
+    """
+    if is_immutable(value):
+        return value
+
+    return _freeze(value)
@@ -185,6 +185,12 @@ def apply_all(all_changes: List[Change]):
     )
     sources: Dict[EnhancedAST, Source] = {}
 
+    for change in all_changes:
+        # the positions of the changes are only valid for the analyzed code
+        ChangeRecorder.current.get_source(change.filename).expect_code(
+            change.source.text
+        )
+
     for change in all_changes:
         if isinstance(change, Delete):
             node = cast(EnhancedAST, change.node).parent
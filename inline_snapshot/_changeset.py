@@ -0,0 +1,297 @@
+"""Change-sets store the snapshots of a test run in a file, which can be
+applied later without running the tests again.
+
+    pytest --inline-snapshot-record=changes.json
+    python -m inline_snapshot apply changes.json
+
+The positions and values of the snapshots are stored with the hashes of the
+files, which have to match when the changes are applied. The changes are
+computed again from the snapshots, like at the end of the test run.
+
+The change-sets of test runs which were split across several machines can
+be merged. The values of the same snapshot are merged like the values of
+xdist workers.
+
+    python -m inline_snapshot apply shard-1.json shard-2.json ...
+
+Change-sets are often downloaded from CI and applying them should not be
+able to execute code. The values are therefore stored with their repr() and
+read with ast.literal_eval(), which supports only literals (and `external()`
+objects). Snapshots with other values (like dirty-equals objects) can not be
+stored.
+"""
+
+import ast
+import base64
+import contextlib
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Tuple
+
+from . import _external
+from . import _inline_snapshot
+from . import _xdist
+from ._change import apply_all
+from ._change import Change
+from ._find_external import ensure_import
+from ._inline_snapshot import update_allowed
+from ._inline_snapshot import used_externals
+from ._rewrite_code import ChangeRecorder
+
+version = 2
+
+
+class ChangeSetError(Exception):
+    pass
+
+
+def file_hash(path) -> str:
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def relative_name(filename, root: Path) -> str:
+    return Path(os.path.relpath(filename, root)).as_posix()
+
+
+class _LoadExternals(ast.NodeTransformer):
+    def visit_Call(self, node):
+        if (
+            isinstance(node.func, ast.Name)
+            and node.func.id == "external"
+            and len(node.args) == 1
+            and not node.keywords
+            and isinstance(node.args[0], ast.Constant)
+            and isinstance(node.args[0].value, str)
+        ):
+            return ast.Constant(value=_external.external(node.args[0].value))
+
+        return self.generic_visit(node)
+
+
+def load_literal(text: str):
+    """Returns the value of `text`, which can only contain literals and
+    `external()` objects."""
+    try:
+        tree = ast.parse(text, mode="eval")
+        return ast.literal_eval(_LoadExternals().visit(tree))
+    except (SyntaxError, ValueError, TypeError):
+        raise ValueError(f"{text} is not a literal") from None
+
+
+def contains_dirty_equals(value) -> bool:
+    if not update_allowed(value):
+        return True
+    if isinstance(value, dict):
+        return any(
+            contains_dirty_equals(key) or contains_dirty_equals(item)
+            for key, item in value.items()
+        )
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return any(contains_dirty_equals(item) for item in value)
+    return False
+
+
+def dump_literal(value) -> str:
+    """Returns the repr() of `value` if it can be read again with
+    `load_literal()` and results in the same repr().
+
+    dirty-equals objects are not supported, because their repr() is the
+    value they were compared with, which would replace them in the source.
+    """
+    text = repr(value)
+
+    if contains_dirty_equals(value):
+        raise ValueError(
+            f"{text} contains dirty-equals objects, which can not be stored"
+        )
+
+    try:
+        loaded = load_literal(text)
+        equal = repr(loaded) == text and bool(loaded == value)
+    except Exception:
+        equal = False
+
+    if not equal:
+        raise ValueError(
+            f"{text} can not be stored, only literals and external() are supported"
+        )
+
+    return text
+
+
+def write_changeset(
+    path, changes: Iterable[Change], root: Path
+) -> Tuple[int, List[str]]:
+    """Writes the snapshots of this test run into the change-set file `path`.
+
+    Returns the number of `changes` which can be applied from the change-set
+    and the errors of the snapshots which could not be stored. Changes
+    without a source node can not be applied and no change can be applied
+    if one of the snapshots could not be stored.
+    """
+    snapshots = _xdist.dump_snapshots(dump_literal, "the change-set")
+
+    changes = [change for change in changes if getattr(change, "node", None)]
+    if snapshots["errors"]:
+        changes = []
+    for snapshot in snapshots["snapshots"]:
+        snapshot["filename"] = relative_name(snapshot["filename"], root)
+    snapshots["files"] = [relative_name(file, root) for file in snapshots["files"]]
+
+    storage = _external.storage
+    externals = {}
+    if storage is not None:
+        # data which was outsourced during this run
+        for name in sorted(storage.list()):
+            if "-new." in name:
+                externals[name] = base64.b64encode(storage.read(name)).decode()
+
+    data = {
+        "version": version,
+        "files": {
+            relative_name(filename, root): file_hash(filename)
+            for filename in sorted(
+                {change.filename for change in changes}
+                | set(_inline_snapshot._files_with_snapshots)
+            )
+        },
+        "snapshots": snapshots,
+        "externals": externals,
+    }
+
+    Path(path).write_text(json.dumps(data, indent=1), "utf-8")
+
+    return len(changes), snapshots["errors"]
+
+
+def read_data(path, root: Path) -> Dict[str, Any]:
+    """Reads the change-set file `path` and saves the externals of the
+    change-set in the storage.
+
+    Raises a ChangeSetError if one of the files was changed after the
+    changes were recorded.
+    """
+    data = json.loads(Path(path).read_text("utf-8"))
+
+    if data.get("version") != version:
+        raise ChangeSetError(f"{path}: unsupported change-set version")
+
+    for filename, hash in data["files"].items():
+        file = root / filename
+        if not file.exists():
+            raise ChangeSetError(f"{filename} does not exist")
+        if file_hash(file) != hash:
+            raise ChangeSetError(
+                f"{filename} was changed after the changes were recorded"
+            )
+
+    storage = _external.storage
+    assert storage is not None
+    for name, content in data["externals"].items():
+        hash, suffix = name.split("-new", 1)
+        if not storage.lookup_all(hash + suffix):
+            storage.save(name, base64.b64decode(content))
+
+    return data
+
+
+@contextlib.contextmanager
+def separate_snapshots():
+    """Uses a separate registry for the snapshots of the change-sets, which
+    does not change the snapshots of the current process (which can be a
+    test run)."""
+    state = (
+        _inline_snapshot.snapshots,
+        _inline_snapshot._files_with_snapshots,
+        _inline_snapshot._update_flags,
+        _inline_snapshot._missing_values,
+        _inline_snapshot._fingerprints,
+        _xdist.errors,
+        _xdist._call_nodes,
+    )
+
+    _inline_snapshot.snapshots = {}
+    _inline_snapshot._files_with_snapshots = set()
+    _inline_snapshot._update_flags = _inline_snapshot.Flags()
+    _inline_snapshot._missing_values = 0
+    _inline_snapshot._fingerprints = _inline_snapshot.Fingerprints()
+    _xdist.errors = []
+    _xdist._call_nodes = {}
+
+    try:
+        yield
+    finally:
+        (
+            _inline_snapshot.snapshots,
+            _inline_snapshot._files_with_snapshots,
+            _inline_snapshot._update_flags,
+            _inline_snapshot._missing_values,
+            _inline_snapshot._fingerprints,
+            _xdist.errors,
+            _xdist._call_nodes,
+        ) = state
+
+
+def read_changesets(paths, root: Path, flags) -> List[Change]:
+    """Merges the snapshots of the change-set files `paths` and returns their
+    changes with the given `flags`.
+
+    The values of the same snapshot are merged like the values of xdist
+    workers. Raises a ChangeSetError if the values can not be merged.
+    """
+    with separate_snapshots():
+        for path in paths:
+            snapshots = read_data(path, root)["snapshots"]
+
+            for snapshot in snapshots["snapshots"]:
+                snapshot["filename"] = str(root / snapshot["filename"])
+            snapshots["files"] = [str(root / file) for file in snapshots["files"]]
+
+            _xdist.load_snapshots(snapshots, load_literal)
+
+        if _xdist.errors:
+            raise ChangeSetError("\n".join(_xdist.errors))
+
+        return [
+            change
+            for snapshot in _inline_snapshot.snapshots.values()
+            for change in snapshot._changes()
+            if change.flag in flags
+        ]
+
+
+def rewrite_files(changes: List[Change]):
+    """Applies the changes to the source files, imports `external` where it
+    is used and persists the used externals."""
+    with ChangeRecorder().activate() as cr:
+        apply_all(changes)
+        write_files(cr)
+
+
+def write_files(cr: ChangeRecorder):
+    """Writes the files of the active ChangeRecorder `cr`, imports `external`
+    where it is used and persists the used externals."""
+    files = cr.changed_files()
+
+    # nothing is imported or persisted if one of the files was changed
+    for test_file in files:
+        test_file.check_unchanged()
+
+    for test_file in files:
+        tree = ast.parse(test_file.new_code())
+        used = used_externals(tree)
+
+        if used:
+            ensure_import(test_file.filename, {"inline_snapshot": ["external"]})
+
+        for external_name in used:
+            assert _external.storage is not None
+            _external.storage.persist(external_name)
+
+    cr.fix_all()
@@ -2,6 +2,7 @@ import os
 from dataclasses import dataclass
 from dataclasses import field
 from pathlib import Path
+from typing import Dict
 from typing import List
 
 import toml
@@ -11,6 +12,8 @@ import toml
 class Config:
     hash_length: int = 12
     default_flags: List[str] = field(default_factory=lambda: ["short-report"])
+    storage_layout: str = "flat"
+    compression: Dict[str, str] = field(default_factory=dict)
 
 
 config = Config()
@@ -35,6 +38,14 @@ def read_config(path: Path) -> Config:
                 result.default_flags = config["default-flags"]
             except KeyError:
                 pass
+            try:
+                result.storage_layout = config["storage-layout"]
+            except KeyError:
+                pass
+            try:
+                result.compression = config["compression"]
+            except KeyError:
+                pass
 
     env_var = "INLINE_SNAPSHOT_DEFAULT_FLAGS"
     if env_var in os.environ:
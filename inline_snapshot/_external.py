@@ -1,76 +1,655 @@
+import bisect
+import fnmatch
 import hashlib
+import io
+import os
 import pathlib
 import re
+import shutil
+import sys
+import tempfile
+from contextlib import nullcontext
+from typing import Any
+from typing import BinaryIO
+from typing import cast
+from typing import ContextManager
+from typing import Dict
+from typing import IO
+from typing import Iterable
+from typing import Iterator
+from typing import List
 from typing import Optional
 from typing import Set
+from typing import TYPE_CHECKING
 from typing import Union
 
 from . import _config
 
+if TYPE_CHECKING:
+    import sqlite3
+
 
 class HashError(Exception):
     pass
 
 
-class DiscStorage:
-    def __init__(self, directory):
+def write_atomic(path: pathlib.Path, data: bytes):
+    """Writes `data` in a way that other processes (xdist workers) never see
+    partially written files."""
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+layouts = ("flat", "sharded", "sqlite")
+
+# the compression formats and the extensions of the compressed files
+codecs = {"gzip": ".gz", "bz2": ".bz2", "lzma": ".xz"}
+
+
+def check_codec(codec):
+    if codec not in codecs:
+        raise ValueError(
+            f"unknown compression {codec!r} (possible compressions: {', '.join(codecs)})"
+        )
+
+
+def file_extension(filename) -> str:
+    """Returns the extension of the compression format of the file
+    `filename` or "" if the file is not compressed.
+
+    Names of externals have only one suffix (`<hash>.txt`), compressed files
+    have an additional extension (`<hash>.txt.gz`).
+    """
+    base, extension = os.path.splitext(filename)
+    if extension in codecs.values() and "." in base:
+        return extension
+    return ""
+
+
+def storage_name(filename) -> str:
+    """The name of the data which is stored in the file `filename`."""
+    return filename[: len(filename) - len(file_extension(filename))]
+
+
+def compressed_writer(extension, file: IO[bytes]) -> ContextManager[Any]:
+    """Returns a file object which writes the compressed data into `file`.
+
+    gzip files are written without timestamp and filename, so that the same
+    data is always stored in the same way.
+    """
+    # the modules of the compression formats are imported when they are used
+    if extension == ".gz":
+        import gzip
+
+        return gzip.GzipFile(filename="", mode="wb", fileobj=file, mtime=0)
+    if extension == ".bz2":
+        import bz2
+
+        return bz2.BZ2File(file, "wb")
+    if extension == ".xz":
+        import lzma
+
+        return lzma.LZMAFile(file, "wb")
+    return nullcontext(file)
+
+
+def compress(extension, data: bytes) -> bytes:
+    if not extension:
+        return data
+    buffer = io.BytesIO()
+    with compressed_writer(extension, buffer) as writer:
+        writer.write(data)
+    return buffer.getvalue()
+
+
+def decompress(extension, data: bytes) -> bytes:
+    if extension == ".gz":
+        import gzip
+
+        return gzip.decompress(data)
+    if extension == ".bz2":
+        import bz2
+
+        return bz2.decompress(data)
+    if extension == ".xz":
+        import lzma
+
+        return lzma.decompress(data)
+    return data
+
+
+# the size of the parts in which file objects are read by outsource()
+chunk_size = 2**20
+
+
+# ioctl request which creates a copy-on-write clone of a file on linux (btrfs, xfs, ...)
+FICLONE = 0x40049409
+
+
+def read_chunks(file: BinaryIO) -> Iterator[bytes]:
+    return iter(lambda: file.read(chunk_size), b"")
+
+
+def hash_file(path) -> str:
+    m = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in read_chunks(file):
+            m.update(chunk)
+    return m.hexdigest()
+
+
+def new_file_mode() -> int:
+    """Returns the permissions of new files, which are defined by the
+    umask."""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def reflink(source, target) -> bool:
+    if sys.platform != "linux":
+        return False
+
+    import fcntl
+
+    with open(source, "rb") as source_file, open(target, "wb") as target_file:
+        try:
+            fcntl.ioctl(target_file.fileno(), FICLONE, source_file.fileno())
+            return True
+        except OSError:
+            pass
+
+    os.unlink(target)
+    return False
+
+
+def link_file(source, target):
+    """Creates `target` with the content of `source` without copying the
+    data if possible (reflink).
+
+    Hard links can not be used, because the stored data would be changed
+    when the file is changed.
+    """
+    if not reflink(source, target):
+        shutil.copyfile(source, target)
+
+
+def check_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    for chunk in chunks:
+        if not isinstance(chunk, bytes):
+            raise TypeError("chunks have to be of type bytes")
+        yield chunk
+
+
+def check_layout(layout):
+    if layout not in layouts:
+        raise ValueError(
+            f"unknown storage layout {layout!r} (possible layouts: {', '.join(layouts)})"
+        )
+
+
+class Storage:
+    """The interface of the storages for external data.
+
+    The data is stored with names like `<hash>.<suffix>` and
+    `<hash>-new.<suffix>` (data which is not referenced in the source code
+    yet). Names can be looked up with patterns like
+    `<partial_hash>*.<suffix>`.
+    """
+
+    def save(self, name, data):
+        raise NotImplementedError()
+
+    def save_new(self, chunks: Iterable[bytes], suffix) -> str:
+        """Saves the data of `chunks` as `<hash>-new<suffix>` (if there is no
+        `<hash><suffix>`) and returns the hash of the data.
+
+        Storages which can write the data in parts should overwrite this,
+        the data is joined in memory by default.
+        """
+        data = b"".join(check_chunks(chunks))
+        hash = hashlib.sha256(data).hexdigest()
+        if not self.lookup_all(hash + suffix):
+            self.save(hash + "-new" + suffix, data)
+        return hash
+
+    def save_file(self, path, suffix) -> str:
+        """Like `save_new()` for the content of the file `path`."""
+        with open(path, "rb") as file:
+            return self.save_new(read_chunks(file), suffix)
+
+    def read(self, name) -> bytes:
+        raise NotImplementedError()
+
+    def list(self) -> Set[str]:
+        raise NotImplementedError()
+
+    def lookup_all(self, name) -> Set[str]:
+        raise NotImplementedError()
+
+    def persist(self, name):
+        """Removes the `-new` suffix of the data."""
+        raise NotImplementedError()
+
+    def remove(self, name):
+        raise NotImplementedError()
+
+    def prune_new_files(self):
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+
+class DiscStorage(Storage):
+    """Stores the external data in a directory.
+
+    The files are stored directly in the directory (`flat` layout) or in
+    subdirectories for the first characters of the hash (`sharded` layout,
+    `ab/cd/abcd....txt`). Files of both layouts can be read, new files are
+    written with the layout of the storage.
+
+    Files with a suffix in `compression` are compressed and get the
+    extension of the compression format (`<hash>.txt.gz`). The hash is
+    computed over the uncompressed data and compressed files can always be
+    read.
+
+    The names of the files are kept in a sorted index, which is read once
+    from the directory and updated by all operations of the storage. Names
+    are looked up with `glob`-like patterns (`<partial_hash>*.<suffix>`),
+    which only have to search the names with the prefix of the pattern.
+    """
+
+    def __init__(self, directory, layout="flat", compression=None):
+        check_layout(layout)
+        compression = dict(compression or {})
+        for codec in compression.values():
+            check_codec(codec)
+
         self.directory = pathlib.Path(directory)
+        self.layout = layout
+        self.compression: Dict[str, str] = compression
+        self._names: Optional[List[str]] = None
+        self._paths: Dict[str, pathlib.Path] = {}
+
+    def _index(self) -> List[str]:
+        if self._names is None:
+            self._refresh()
+            assert self._names is not None
+        return self._names
+
+    def _refresh(self):
+        # .gitignore and temporary files are not part of the storage
+        self._paths = {}
+        if self.directory.exists():
+            for item in self.directory.iterdir():
+                if item.name.startswith("."):
+                    continue
+                if item.is_dir():
+                    for file in item.glob("??/*"):
+                        if not file.name.startswith("."):
+                            self._paths[storage_name(file.name)] = file
+                else:
+                    self._paths[storage_name(item.name)] = item
+        self._names = sorted(self._paths)
+
+    def _extension(self, suffix) -> str:
+        codec = self.compression.get(suffix)
+        return "" if codec is None else codecs[codec]
+
+    def _file_path(self, name) -> pathlib.Path:
+        """The path where the data with the name `name` is written."""
+        filename = name + self._extension(pathlib.PurePath(name).suffix)
+        return self._layout_path(filename)
+
+    def _layout_path(self, filename) -> pathlib.Path:
+        if self.layout == "sharded":
+            return self.directory / filename[:2] / filename[2:4] / filename
+        return self.directory / filename
+
+    def _add(self, name, path: pathlib.Path):
+        old_path = self._paths.get(name)
+        if old_path is not None and old_path != path:
+            # the file was stored with an other layout or compression
+            old_path.unlink(missing_ok=True)
+
+        self._paths[name] = path
+        names = self._index()
+        i = bisect.bisect_left(names, name)
+        if i == len(names) or names[i] != name:
+            names.insert(i, name)
+
+    def _discard(self, name):
+        self._paths.pop(name, None)
+        names = self._index()
+        i = bisect.bisect_left(names, name)
+        if i != len(names) and names[i] == name:
+            del names[i]
+
+    def _match(self, pattern) -> List[str]:
+        names = self._index()
+        prefix = pattern.split("*", 1)[0]
+
+        if prefix == pattern:
+            i = bisect.bisect_left(names, pattern)
+            return names[i : i + 1] if names[i : i + 1] == [pattern] else []
+
+        result = []
+        for i in range(bisect.bisect_left(names, prefix), len(names)):
+            name = names[i]
+            if not name.startswith(prefix):
+                break
+            if fnmatch.fnmatchcase(name, pattern):
+                result.append(name)
+        return result
 
     def _ensure_directory(self):
         self.directory.mkdir(exist_ok=True, parents=True)
         gitignore = self.directory / ".gitignore"
         if not gitignore.exists():
-            gitignore.write_text(
-                "# ignore all snapshots which are not refered in the source\n*-new.*\n",
-                "utf-8",
+            write_atomic(
+                gitignore,
+                b"# ignore all snapshots which are not refered in the source\n*-new.*\n",
             )
 
     def save(self, name, data):
         assert "*" not in name
         self._ensure_directory()
-        (self.directory / name).write_bytes(data)
+        self._index()
+        path = self._file_path(name)
+        path.parent.mkdir(exist_ok=True, parents=True)
+        write_atomic(path, compress(file_extension(path.name), data))
+        self._add(name, path)
+
+    def save_new(self, chunks: Iterable[bytes], suffix) -> str:
+        self._ensure_directory()
+        m = hashlib.sha256()
+
+        with tempfile.NamedTemporaryFile(
+            dir=self.directory, prefix=".outsource.", suffix=".tmp", delete=False
+        ) as file:
+            try:
+                with compressed_writer(self._extension(suffix), file) as writer:
+                    for chunk in check_chunks(chunks):
+                        m.update(chunk)
+                        writer.write(chunk)
+            except BaseException:
+                file.close()
+                os.unlink(file.name)
+                raise
+
+        hash = m.hexdigest()
+
+        if self.lookup_all(hash + suffix):
+            os.unlink(file.name)
+        else:
+            name = hash + "-new" + suffix
+            path = self._file_path(name)
+            path.parent.mkdir(exist_ok=True, parents=True)
+            # temporary files are only readable by the user
+            os.chmod(file.name, new_file_mode())
+            os.replace(file.name, path)
+            self._add(name, path)
+
+        return hash
+
+    def save_file(self, path, suffix) -> str:
+        if self._extension(suffix):
+            # compressed files can not be linked
+            return super().save_file(path, suffix)
+
+        hash = hash_file(path)
+
+        if not self.lookup_all(hash + suffix):
+            self._ensure_directory()
+            name = hash + "-new" + suffix
+            target = self._file_path(name)
+            target.parent.mkdir(exist_ok=True, parents=True)
+
+            tmp_path = target.with_name(f".{name}.{os.getpid()}.tmp")
+            link_file(path, tmp_path)
+            os.replace(tmp_path, target)
+            self._add(name, target)
+
+        return hash
 
     def read(self, name):
-        return self._lookup_path(name).read_bytes()
+        name = self._lookup_name(name)
+        path = self._paths[name]
+        return decompress(file_extension(path.name), path.read_bytes())
 
     def prune_new_files(self):
-        for file in self.directory.glob("*-new.*"):
-            file.unlink()
+        for name in self._match("*-new.*"):
+            self._paths[name].unlink()
+            self._discard(name)
 
     def list(self) -> Set[str]:
-        if self.directory.exists():
-            return {item.name for item in self.directory.iterdir()} - {".gitignore"}
-        else:
-            return set()
+        return set(self._index())
 
     def persist(self, name):
         try:
-            file = self._lookup_path(name)
+            name = self._lookup_name(name)
         except HashError:
             return
-        if file.stem.endswith("-new"):
-            stem = file.stem[:-4]
-            file.rename(file.with_name(stem + file.suffix))
+        stem, dot, suffix = name.rpartition(".")
+        if stem.endswith("-new"):
+            new_name = stem[:-4] + dot + suffix
+            file = self._paths[name]
+            new_file = file.with_name(new_name + file_extension(file.name))
+            file.rename(new_file)
+            self._discard(name)
+            self._add(new_name, new_file)
+
+    def _lookup_name(self, name) -> str:
+        names = self._match(name)
+
+        if not names:
+            # the file might have been created by an other process (xdist worker)
+            self._refresh()
+            names = self._match(name)
+
+        if len(names) > 1:
+            raise HashError(f"hash collision files={sorted(names)}")
+
+        if not names:
+            raise HashError(f"hash {name!r} is not found in the DiscStorage")
+
+        return names[0]
 
-    def _lookup_path(self, name) -> pathlib.Path:
-        files = list(self.directory.glob(name))
+    def lookup_all(self, name) -> Set[str]:
+        return set(self._match(name))
 
-        if len(files) > 1:
-            raise HashError(f"hash collision files={sorted(f.name for f in  files)}")
+    def remove(self, name):
+        name = self._lookup_name(name)
+        file = self._paths[name]
+        file.unlink()
+        self._discard(name)
+        self._remove_empty_directories(file)
+
+    def _remove_empty_directories(self, path: pathlib.Path):
+        # the directories of the sharded layout
+        parent = path.parent
+        while parent != self.directory and not any(parent.iterdir()):
+            parent.rmdir()
+            parent = parent.parent
+
+    def migrate(self, layout) -> int:
+        """Moves all files into the given `layout` (and compression) and
+        returns the number of moved files."""
+        check_layout(layout)
+        self.layout = layout
+        self._refresh()
+
+        moved = 0
+        for name in self._index():
+            old_path = self._paths[name]
+            new_path = self._file_path(name)
+            if old_path != new_path:
+                new_path.parent.mkdir(exist_ok=True, parents=True)
+                if file_extension(old_path.name) == file_extension(new_path.name):
+                    os.replace(old_path, new_path)
+                else:
+                    data = decompress(
+                        file_extension(old_path.name), old_path.read_bytes()
+                    )
+                    write_atomic(
+                        new_path, compress(file_extension(new_path.name), data)
+                    )
+                    old_path.unlink()
+                self._paths[name] = new_path
+                moved += 1
+                self._remove_empty_directories(old_path)
+
+        return moved
+
+
+class SqliteStorage(Storage):
+    """Stores the external data in a single SQLite database, which is faster
+    to check out and to scan than many small files.
+
+    The database uses write-ahead logging, which allows xdist workers to
+    write to it at the same time.
+    """
 
-        if not files:
-            raise HashError(f"hash {name!r} is not found in the DiscStorage")
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self._connection: Optional["sqlite3.Connection"] = None
+
+    def _db(self) -> "sqlite3.Connection":
+        if self._connection is None:
+            import sqlite3
 
-        return files[0]
+            self.path.parent.mkdir(exist_ok=True, parents=True)
+            connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS externals (name TEXT PRIMARY KEY, data BLOB NOT NULL)"
+            )
+            self._connection = connection
+        return self._connection
+
+    def _match(self, pattern) -> List[str]:
+        if self._connection is None and not self.path.exists():
+            return []
+        # GLOB uses the index of the primary key for the prefix of the pattern
+        return [
+            name
+            for (name,) in self._db().execute(
+                "SELECT name FROM externals WHERE name GLOB ? ORDER BY name",
+                (pattern,),
+            )
+        ]
+
+    def _lookup_name(self, name) -> str:
+        names = self._match(name)
+
+        if len(names) > 1:
+            raise HashError(f"hash collision files={names}")
+
+        if not names:
+            raise HashError(f"hash {name!r} is not found in the SqliteStorage")
+
+        return names[0]
+
+    def save(self, name, data):
+        assert "*" not in name
+        self._db().execute(
+            "INSERT OR REPLACE INTO externals (name, data) VALUES (?, ?)", (name, data)
+        )
+
+    def read(self, name) -> bytes:
+        name = self._lookup_name(name)
+        (data,) = (
+            self._db()
+            .execute("SELECT data FROM externals WHERE name = ?", (name,))
+            .fetchone()
+        )
+        return data
+
+    def list(self) -> Set[str]:
+        return set(self._match("*"))
 
     def lookup_all(self, name) -> Set[str]:
-        return {file.name for file in self.directory.glob(name)}
+        return set(self._match(name))
+
+    def persist(self, name):
+        try:
+            name = self._lookup_name(name)
+        except HashError:
+            return
+        stem, dot, suffix = name.rpartition(".")
+        if stem.endswith("-new"):
+            self._db().execute(
+                "UPDATE OR REPLACE externals SET name = ? WHERE name = ?",
+                (stem[:-4] + dot + suffix, name),
+            )
 
     def remove(self, name):
-        self._lookup_path(name).unlink()
+        self._db().execute(
+            "DELETE FROM externals WHERE name = ?", (self._lookup_name(name),)
+        )
+
+    def prune_new_files(self):
+        if self._connection is not None or self.path.exists():
+            self._db().execute("DELETE FROM externals WHERE name GLOB '*-new.*'")
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
 
 
-storage: Optional[DiscStorage] = None
+def check_storage(layout, compression):
+    check_layout(layout)
+
+    if layout == "sqlite" and compression:
+        raise ValueError("the sqlite storage layout does not support compression")
+
+
+def create_storage(directory, layout, compression=None) -> Storage:
+    """Creates the storage for the external directory `directory` with the
+    given layout."""
+    check_storage(layout, compression)
+    directory = pathlib.Path(directory)
+
+    if layout == "sqlite":
+        return SqliteStorage(directory.with_suffix(".sqlite"))
+
+    return DiscStorage(directory, layout, compression)
+
+
+def migrate_storage(directory, layout, compression=None) -> int:
+    """Moves the data of all storages of `directory` into the storage with
+    the given layout (and compression) and returns the number of moved
+    entries."""
+    check_storage(layout, compression)
+    directory = pathlib.Path(directory)
+
+    disc = DiscStorage(directory, "flat" if layout == "sqlite" else layout, compression)
+    database = SqliteStorage(directory.with_suffix(".sqlite"))
+
+    if layout == "sqlite":
+        source: Storage = disc
+        target: Storage = database
+        moved = 0
+    else:
+        source = database
+        target = disc
+        moved = disc.migrate(layout)
+
+    for name in sorted(source.list()):
+        target.save(name, source.read(name))
+        source.remove(name)
+        moved += 1
+
+    database.close()
+
+    return moved
+
+
+storage: Optional[Storage] = None
 
 
 class external:
@@ -133,7 +712,13 @@ class external:
         return storage.read(self._path)
 
 
-def outsource(data: Union[str, bytes], *, suffix: Optional[str] = None) -> external:
+def outsource(
+    data: Union[
+        str, bytes, bytearray, memoryview, os.PathLike, BinaryIO, Iterable[bytes]
+    ],
+    *,
+    suffix: Optional[str] = None,
+) -> external:
     """Outsource some data into an external file.
 
     ``` pycon
@@ -143,24 +728,54 @@ def outsource(data: Union[str, bytes], *, suffix: Optional[str] = None) -> exter
 
     ```
 
+    Large data can be passed as binary file object or as iterable of `#!python bytes`,
+    which are written to the storage without loading the whole data into memory.
+
+    ``` pycon
+    >>> with open("large.bin", "rb") as f:  # doctest: +SKIP
+    ...     outsource(f, suffix=".bin")
+    ...
+
+    ```
+
+    Existing files can be outsourced with their path (`#!python pathlib.Path`).
+    The file is cloned into the storage (reflink) if this is supported by the
+    file system and copied otherwise.
+    Later changes of the file do not change the outsourced data.
+
     Parameters:
         data: data which should be outsourced. strings are encoded with `"utf-8"`.
+            `#!python bytearray` and `#!python memoryview` objects are handled like `#!python bytes`.
 
-        suffix: overwrite file suffix. The default is `".bin"` if data is an instance of `#!python bytes` and `".txt"` for `#!python str`.
+        suffix: overwrite file suffix. The default is `".bin"` if data is an instance of `#!python bytes` (or a file object or iterable of bytes), `".txt"` for `#!python str` and the suffix of the file for paths.
 
     Returns:
         The external data.
     """
+    if isinstance(data, os.PathLike):
+        return outsource_file(data, suffix)
+
+    if not isinstance(data, (str, bytes, bytearray, memoryview)) and (
+        hasattr(data, "read") or isinstance(data, Iterable)
+    ):
+        return outsource_chunks(
+            cast(Iterable[bytes], data), ".bin" if suffix is None else suffix
+        )
+
     if isinstance(data, str):
         data = data.encode("utf-8")
         if suffix is None:
             suffix = ".txt"
 
-    elif isinstance(data, bytes):
+    elif isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data)
         if suffix is None:
             suffix = ".bin"
+
     else:
-        raise TypeError("data has to be of type bytes | str")
+        raise TypeError(
+            "data has to be of type bytes | str | binary file | Iterable[bytes]"
+        )
 
     if not suffix or suffix[0] != ".":
         raise ValueError("suffix has to start with a '.' like '.png'")
@@ -178,3 +793,32 @@ def outsource(data: Union[str, bytes], *, suffix: Optional[str] = None) -> exter
         storage.save(path, data)
 
     return external(name)
+
+
+def outsource_chunks(data: Union[BinaryIO, Iterable[bytes]], suffix: str) -> external:
+    """Outsources the data of a binary file object or of the chunks of an
+    iterable."""
+    if not suffix or suffix[0] != ".":
+        raise ValueError("suffix has to start with a '.' like '.png'")
+
+    if hasattr(data, "read"):
+        chunks: Iterable[bytes] = read_chunks(cast(BinaryIO, data))
+    else:
+        chunks = cast(Iterable[bytes], data)
+
+    assert storage is not None
+
+    return external(storage.save_new(chunks, suffix) + suffix)
+
+
+def outsource_file(path: os.PathLike, suffix: Optional[str]) -> external:
+    """Outsources the content of the file `path`."""
+    if suffix is None:
+        suffix = pathlib.Path(path).suffix or ".bin"
+
+    if suffix[0] != ".":
+        raise ValueError("suffix has to start with a '.' like '.png'")
+
+    assert storage is not None
+
+    return external(storage.save_file(path, suffix) + suffix)
@@ -1,16 +1,353 @@
+import ast
+import hashlib
+import os
 import warnings
+from bisect import bisect_right
+from dataclasses import fields
+from dataclasses import replace
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Pattern
+from typing import Sequence
+from typing import Tuple
+from typing import TYPE_CHECKING
 
-from black import main
-from click.testing import CliRunner
+if TYPE_CHECKING:
+    import black
 
+# black (and click) are imported when code is formatted for the first time,
+# because importing black takes longer than the rest of inline-snapshot
 
-def format_code(text, filename):
+
+def supports_line_ranges() -> bool:
+    import black
+
+    # black supports --line-ranges since 24.1.0
+    return hasattr(black, "parse_line_ranges")
+
+
+LineRanges = Sequence[Tuple[int, int]]
+
+# changed when the results of the formatter change for the same black version
+cache_version = 2
+
+
+def merge_line_ranges(lines: LineRanges) -> List[Tuple[int, int]]:
+    result: List[Tuple[int, int]] = []
+    for start, end in sorted(lines):
+        if result and start <= result[-1][1] + 1:
+            result[-1] = (result[-1][0], max(end, result[-1][1]))
+        else:
+            result.append((start, end))
+    return result
+
+
+def statement_line_ranges(src: str, lines: LineRanges) -> List[Tuple[int, int]]:
+    """Extends the line ranges to the top level statements which they touch.
+
+    black can not reformat a statement which is only partially inside the
+    formatted lines. Raises a SyntaxError if `src` can not be parsed.
+    """
+    statements = []
+    for node in ast.parse(src).body:
+        start = min(
+            [node.lineno]
+            + [decorator.lineno for decorator in getattr(node, "decorator_list", [])]
+        )
+        end = node.end_lineno
+        assert end is not None
+        statements.append((start, end))
+
+    starts = [start for start, _ in statements]
+
+    result = []
+    for start, end in lines:
+        index = bisect_right(starts, end) - 1
+        while index >= 0 and statements[index][1] >= start:
+            start = min(start, statements[index][0])
+            end = max(end, statements[index][1])
+            index -= 1
+        result.append((start, end))
+
+    return merge_line_ranges(result)
+
+
+class Formatter:
+    """Formats code with black like `black --stdin-filename <filename> -`
+    would do it, but without the overhead of the command line interface.
+
+    Files which are excluded with `force-exclude` are returned unchanged (the
+    cli writes nothing in this case). `exclude` does not apply to the stdin
+    filename, like in the cli.
+    """
+
+    def __init__(
+        self,
+        mode: Optional["black.Mode"],
+        fast: bool = False,
+        force_exclude: Optional[Pattern[str]] = None,
+        root: Optional[Path] = None,
+    ):
+        self.mode = mode
+        self.fast = fast
+        self.force_exclude = force_exclude
+        self.root = root
+
+    def is_excluded(self, filename) -> bool:
+        """Returns True if `filename` is excluded with `force-exclude`."""
+        if self.force_exclude is None or self.root is None:
+            return False
+
+        try:
+            path = Path(filename).resolve().relative_to(self.root)
+        except ValueError:
+            return False
+
+        match = self.force_exclude.search("/" + path.as_posix())
+        return bool(match and match.group(0))
+
+    def can_format_lines(self) -> bool:
+        return supports_line_ranges() and not (self.mode and self.mode.is_ipynb)
+
+    def cache_key(self, text: str, lines: LineRanges = ()) -> Optional[str]:
+        """Returns a key which identifies the result of `format(text, lines)`
+        or None if the result should not be cached."""
+        if self.mode is None:
+            return None
+
+        import black
+
+        if not self.can_format_lines():
+            lines = ()
+
+        m = hashlib.sha256()
+        m.update(f"{cache_version}\0".encode())
+        m.update(f"{black.__version__}\0{self.mode.get_cache_key()}\0".encode())
+        m.update(b"1" if self.fast else b"0")
+        m.update(f"{sorted(lines)}\0".encode())
+        m.update(text.encode("utf-8", "surrogatepass"))
+        return m.hexdigest()
+
+    def format(self, text: str, lines: LineRanges = ()) -> str:
+        """Formats `text`.
+
+        Only the given `lines` (1-based and inclusive ranges) are formatted
+        if they are not empty. The whole text is formatted if black is not
+        able to format line ranges.
+        """
+        if self.mode is None:
+            return text
+
+        import black
+
+        # black reads stdin with universal newlines
+        src = text.replace("\r\n", "\n").replace("\r", "\n")
+
+        # black removes the utf-8 BOM before it formats the code and writes it
+        # again (like the utf-8-sig codec)
+        bom = src.startswith("\ufeff")
+        if bom:
+            src = src[1:]
+
+        line_options = {}
+        if lines and self.can_format_lines():
+            try:
+                line_options["lines"] = statement_line_ranges(src, lines)
+            except SyntaxError:
+                # black will fail anyway
+                pass
+
+        try:
+            dst = black.format_file_contents(
+                src, fast=self.fast, mode=self.mode, **line_options
+            )
+        except black.NothingChanged:
+            dst = src
+        except Exception:
+            # black reports the error and writes the unchanged input to stdout
+            dst = src
+
+        if dst and dst[-1] != "\n":
+            dst += "\n"
+
+        if bom:
+            dst = "\ufeff" + dst
+
+        return dst
+
+
+def resolve_formatter(filename) -> Formatter:
+    """Resolves the black configuration which applies to `filename` in the
+    same way as the black cli does it."""
+    import black
+    import click
+
+    try:
+        ctx = black.main.make_context("black", ["--stdin-filename", str(filename), "-"])
+    except click.ClickException:
+        # black would fail for every file with this configuration
+        return Formatter(None)
+
+    params = ctx.params
+
+    options: Dict[str, Any] = {
+        "target_versions": set(params.get("target_version") or ()),
+        "line_length": params.get("line_length"),
+        "is_pyi": params.get("pyi"),
+        "is_ipynb": params.get("ipynb"),
+        "skip_source_first_line": params.get("skip_source_first_line"),
+        "string_normalization": not params.get("skip_string_normalization"),
+        "magic_trailing_comma": not params.get("skip_magic_trailing_comma"),
+        "preview": params.get("preview"),
+        "unstable": params.get("unstable"),
+        "python_cell_magics": set(params.get("python_cell_magics") or ()),
+        "enabled_features": set(params.get("enable_unstable_feature") or ()),
+    }
+    mode_fields = {field.name for field in fields(black.Mode)}
+    mode = black.Mode(**{k: v for k, v in options.items() if k in mode_fields})
+
+    suffix = Path(filename).suffix
+    if suffix == ".pyi":
+        mode = replace(mode, is_pyi=True)
+    elif suffix == ".ipynb":
+        mode = replace(mode, is_ipynb=True)
+
+    root, _ = black.find_project_root(("-",), str(filename))
+
+    return Formatter(
+        mode,
+        fast=bool(params.get("fast")),
+        force_exclude=params.get("force_exclude"),
+        root=root.resolve(),
+    )
+
+
+_formatters: Dict[Tuple[Optional[str], int, str], Formatter] = {}
+
+
+def get_formatter(filename) -> Formatter:
+    """Returns the formatter for `filename`.
+
+    The configuration is resolved once per project and is only resolved
+    again if the `pyproject.toml` changes.
+    """
+    import black
+
+    pyproject = black.find_pyproject_toml(("-",), str(filename))
+    try:
+        mtime = os.stat(pyproject).st_mtime_ns if pyproject is not None else 0
+    except OSError:
+        mtime = 0
+
+    key = (pyproject, mtime, Path(filename).suffix)
+
+    if key not in _formatters:
+        _formatters[key] = resolve_formatter(filename)
+
+    return _formatters[key]
+
+
+class FormatCache:
+    """Persistent cache for formatted code.
+
+    Every entry is stored in a file which is named after its key. The least
+    recently used entries are removed by `prune()` when the size of the cache
+    grows beyond `max_size` bytes.
+    """
+
+    def __init__(self, directory, max_size: int = 50 * 1024 * 1024):
+        self.directory = Path(directory)
+        self.max_size = max_size
+        self._grown = False
+
+    def _ensure_directory(self):
+        self.directory.mkdir(exist_ok=True, parents=True)
+        gitignore = self.directory / ".gitignore"
+        if not gitignore.exists():
+            gitignore.write_text(
+                "# the cache is recreated automatically\n*\n",
+                "utf-8",
+            )
+
+    def get(self, key: str) -> Optional[str]:
+        path = self.directory / key
+        try:
+            data = path.read_bytes()
+            # mark the entry as recently used
+            os.utime(path)
+        except OSError:
+            return None
+
+        return data.decode("utf-8", "surrogatepass")
+
+    def set(self, key: str, text: str):
+        self._ensure_directory()
+        path = self.directory / key
+
+        # other processes (xdist) should never see partially written entries
+        tmp_path = path.with_name(f"{key}.{os.getpid()}.tmp")
+        tmp_path.write_bytes(text.encode("utf-8", "surrogatepass"))
+        os.replace(tmp_path, path)
+
+        self._grown = True
+
+    def prune(self):
+        """Removes the least recently used entries until the cache fits into
+        `max_size`."""
+        if not self._grown:
+            return
+
+        entries = []
+        total_size = 0
+        for path in self.directory.iterdir():
+            if path.name == ".gitignore":
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+            total_size += stat.st_size
+
+        entries.sort()
+
+        for _, size, path in entries:
+            if total_size <= self.max_size:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            total_size -= size
+
+        self._grown = False
+
+
+cache: Optional[FormatCache] = None
+
+
+def format_code(text, filename, lines: LineRanges = ()):
     with warnings.catch_warnings():
         warnings.simplefilter("ignore")
 
-        runner = CliRunner(mix_stderr=False)
-        result = runner.invoke(
-            main, ["--stdin-filename", str(filename), "-"], input=text
-        )
+        formatter = get_formatter(filename)
+
+        if formatter.is_excluded(filename):
+            return text
+
+        key = formatter.cache_key(text, lines) if cache is not None else None
+
+        if key is None:
+            return formatter.format(text, lines)
+
+        assert cache is not None
+
+        result = cache.get(key)
+        if result is None:
+            result = formatter.format(text, lines)
+            cache.set(key, result)
 
-    return result.stdout
+        return result
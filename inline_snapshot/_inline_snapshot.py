@@ -1,12 +1,15 @@
 import ast
-import copy
+import hashlib
 import inspect
+import os
+import sys
 import tokenize
 from collections import defaultdict
 from pathlib import Path
 from typing import Any
 from typing import Dict  # noqa
 from typing import Iterator
+from typing import Optional
 from typing import Set
 from typing import Tuple  # noqa
 from typing import TypeVar
@@ -15,6 +18,7 @@ from executing import Source
 
 from ._align import add_x
 from ._align import align
+from ._capture import freeze
 from ._change import apply_all
 from ._change import CallArg
 from ._change import Change
@@ -24,17 +28,20 @@ from ._change import ListInsert
 from ._change import Replace
 from ._format import format_code
 from ._sentinels import undefined
+from ._utils import constant_token
 from ._utils import ignore_tokens
 from ._utils import normalize
 from ._utils import simple_token
+from ._utils import token_key
 from ._utils import value_to_token
+from ._utils import ValueIndex
 
 
 class NotImplementedYet(Exception):
     pass
 
 
-snapshots = {}  # type: Dict[Tuple[int, int], Snapshot]
+snapshots = {}  # type: Dict[Tuple[Any, ...], Snapshot]
 
 _active = False
 
@@ -43,6 +50,59 @@ _files_with_snapshots: Set[str] = set()
 _missing_values = 0
 
 
+def fingerprint_of(*parts) -> str:
+    m = hashlib.sha256()
+    for part in parts:
+        m.update(part.encode("utf-8", "surrogatepass"))
+        m.update(b"\0")
+    return m.hexdigest()[:32]
+
+
+class Fingerprints:
+    """Remembers the snapshots which had no changes in a previous run.
+
+    The fingerprints are stored per file together with the hash of the
+    source code and are only valid as long as the source does not change.
+    """
+
+    def __init__(self, data=None):
+        self._previous: Dict[str, Dict[str, Any]] = dict(data or {})
+        self._current: Dict[str, Dict[str, Any]] = {}
+
+    def _file_entry(self, filename):
+        if filename not in self._current:
+            # the source which was analyzed by executing during the test run
+            file_hash = fingerprint_of(Source.for_filename(filename).text)
+            sites = {}
+            previous = self._previous.get(filename)
+            if previous is not None and previous["hash"] == file_hash:
+                sites = dict(previous["sites"])
+            self._current[filename] = {"hash": file_hash, "sites": sites}
+
+        return self._current[filename]
+
+    def is_unchanged(self, filename, site, fingerprint) -> bool:
+        entry = self._file_entry(filename)
+        return entry["sites"].get(site) == fingerprint
+
+    def set_unchanged(self, filename, site, fingerprint):
+        entry = self._file_entry(filename)
+        entry["sites"][site] = fingerprint
+
+    def data(self):
+        # the entries of deleted or renamed files are removed
+        data = {
+            filename: entry
+            for filename, entry in self._previous.items()
+            if os.path.exists(filename)
+        }
+        data.update(self._current)
+        return data
+
+
+_fingerprints = Fingerprints()
+
+
 class Flags:
     """
     fix: the value needs to be changed to pass the tests
@@ -119,6 +179,15 @@ class GenericValue:
     def _get_changes(self) -> Iterator[Change]:
         raise NotImplementedYet()
 
+    def _fingerprint(self) -> Optional[str]:
+        """Returns a fingerprint for the values of this snapshot or None if
+        this snapshot has to be checked for changes every time.
+
+        The changes of a snapshot are not computed if the fingerprint and the
+        source are the same as in a previous run without changes.
+        """
+        return None
+
     def _new_code(self):
         raise NotImplementedYet()
 
@@ -165,14 +234,17 @@ class UndecidedValue(GenericValue):
     def _new_code(self):
         return ""
 
+    def _fingerprint(self):
+        return fingerprint_of(type(self).__name__, repr(self._old_value))
+
     def _get_changes(self) -> Iterator[Change]:
         # generic fallback
+        if self._ast_node is None:
+            return
+
         new_token = value_to_token(self._old_value)
 
-        if (
-            self._ast_node is not None
-            and self._token_of_node(self._ast_node) != new_token
-        ):
+        if self._token_of_node(self._ast_node) != new_token:
             flag = "update"
         else:
             return
@@ -211,17 +283,10 @@ class UndecidedValue(GenericValue):
         return self[item]
 
 
-try:
-    import dirty_equals  # type: ignore
-except ImportError:  # pragma: no cover
-
-    def update_allowed(value):
-        return True
-
-else:
-
-    def update_allowed(value):
-        return not isinstance(value, dirty_equals.DirtyEquals)
+def update_allowed(value):
+    # dirty_equals is already imported if `value` is a DirtyEquals instance
+    dirty_equals = sys.modules.get("dirty_equals")
+    return dirty_equals is None or not isinstance(value, dirty_equals.DirtyEquals)
 
 
 class EqValue(GenericValue):
@@ -232,22 +297,99 @@ class EqValue(GenericValue):
         if self._old_value is undefined:
             _missing_values += 1
 
-        other = copy.deepcopy(other)
-
         if self._new_value is undefined:
-            self._new_value = other
+            # the value is compared with the copy which is stored
+            other = self._new_value = freeze(other)
 
         return self._visible_value() == other
 
     def _new_code(self):
         return self._value_to_code(self._new_value)
 
+    def _fingerprint(self):
+        if not self._old_value == self._new_value:
+            return None
+
+        return fingerprint_of(
+            type(self).__name__, repr(self._old_value), repr(self._new_value)
+        )
+
     def _get_changes(self) -> Iterator[Change]:
 
         assert self._old_value is not undefined
 
+        # structural hashes of the source nodes and the new values, which are
+        # computed once for every subtree.
+        node_hashes: Dict[int, int] = {}
+        value_hashes: Dict[int, int] = {}
+
+        def node_hash(node):
+            key = id(node)
+            if key not in node_hashes:
+                # marks the tokens of the nodes
+                self._source.asttokens()
+
+                if isinstance(node, (ast.List, ast.Tuple)):
+                    result = hash(
+                        (type(node).__name__, tuple(node_hash(e) for e in node.elts))
+                    )
+                elif isinstance(node, ast.Dict) and None not in node.keys:
+                    result = hash(
+                        (
+                            "Dict",
+                            tuple(
+                                (node_hash(k), node_hash(v))
+                                for k, v in zip(node.keys, node.values)
+                            ),
+                        )
+                    )
+                elif (
+                    isinstance(node, ast.Constant)
+                    and node.first_token is node.last_token
+                ):
+                    # there is no need to tokenize and evaluate the source again
+                    result = hash(
+                        token_key([constant_token(node.first_token, node.value)])
+                    )
+                else:
+                    result = hash(token_key(self._token_of_node(node)))
+                node_hashes[key] = result
+            return node_hashes[key]
+
+        def value_hash(value):
+            key = id(value)
+            if key not in value_hashes:
+                if isinstance(value, (list, tuple)):
+                    result = hash(
+                        (
+                            "List" if isinstance(value, list) else "Tuple",
+                            tuple(value_hash(e) for e in value),
+                        )
+                    )
+                elif isinstance(value, dict):
+                    result = hash(
+                        (
+                            "Dict",
+                            tuple(
+                                (value_hash(k), value_hash(v)) for k, v in value.items()
+                            ),
+                        )
+                    )
+                else:
+                    result = hash(token_key(value_to_token(value)))
+                value_hashes[key] = result
+            return value_hashes[key]
+
         def check(old_value, old_node, new_value):
 
+            if (
+                self._ast_node is not None
+                and node_hash(old_node) == value_hash(new_value)
+                and old_value == new_value
+            ):
+                # the source of this subtree has the same tokens as the new value
+                return
+
             if (
                 isinstance(old_node, ast.List)
                 and isinstance(new_value, list)
@@ -298,12 +440,9 @@ class EqValue(GenericValue):
                 for value, node in zip(old_value.keys(), old_node.keys):
                     assert node is not None
 
-                    try:
-                        # this is just a sanity check, dicts should be ordered
-                        node_value = ast.literal_eval(node)
-                    except:
-                        continue
-                    assert node_value == value
+                    # this is just a sanity check, dicts should be ordered
+                    if isinstance(node, ast.Constant):
+                        assert node.value == value
 
                 for key, node in zip(old_value.keys(), old_node.values):
                     if key in new_value:
@@ -353,20 +492,18 @@ class EqValue(GenericValue):
                 return
 
             # generic fallback
-            new_token = value_to_token(new_value)
-
             if not old_value == new_value:
                 flag = "fix"
             elif (
                 self._ast_node is not None
-                and self._token_of_node(old_node) != new_token
                 and update_allowed(old_value)
+                and self._token_of_node(old_node) != value_to_token(new_value)
             ):
                 flag = "update"
             else:
                 return
 
-            new_code = self._token_to_code(new_token)
+            new_code = self._value_to_code(new_value)
 
             yield Replace(
                 node=old_node,
@@ -391,35 +528,39 @@ class MinMaxValue(GenericValue):
         global _missing_values
         if self._old_value is undefined:
             _missing_values += 1
-        other = copy.deepcopy(other)
 
-        if self._new_value is undefined:
-            self._new_value = other
-        else:
-            self._new_value = (
-                self._new_value if self.cmp(self._new_value, other) else other
-            )
+        if self._new_value is undefined or not self.cmp(self._new_value, other):
+            other = self._new_value = freeze(other)
 
         return self.cmp(self._visible_value(), other)
 
     def _new_code(self):
         return self._value_to_code(self._new_value)
 
+    def _fingerprint(self):
+        if not (
+            self.cmp(self._old_value, self._new_value)
+            and self.cmp(self._new_value, self._old_value)
+        ):
+            return None
+
+        return fingerprint_of(
+            type(self).__name__, repr(self._old_value), repr(self._new_value)
+        )
+
     def _get_changes(self) -> Iterator[Change]:
-        new_token = value_to_token(self._new_value)
         if not self.cmp(self._old_value, self._new_value):
             flag = "fix"
         elif not self.cmp(self._new_value, self._old_value):
             flag = "trim"
-        elif (
-            self._ast_node is not None
-            and self._token_of_node(self._ast_node) != new_token
-        ):
+        elif self._ast_node is None:
+            return
+        elif self._token_of_node(self._ast_node) != value_to_token(self._new_value):
             flag = "update"
         else:
             return
 
-        new_code = self._token_to_code(new_token)
+        new_code = self._value_to_code(self._new_value)
 
         yield Replace(
             node=self._ast_node,
@@ -475,28 +616,46 @@ class MaxValue(MinMaxValue):
 
 class CollectionValue(GenericValue):
     _current_op = "x in snapshot"
+    _new_index: ValueIndex
+    _old_index: Optional[ValueIndex] = None
 
     def __contains__(self, item):
         global _missing_values
         if self._old_value is undefined:
             _missing_values += 1
 
-        item = copy.deepcopy(item)
-
         if self._new_value is undefined:
-            self._new_value = [item]
-        else:
-            if item not in self._new_value:
-                self._new_value.append(item)
+            self._new_index = ValueIndex()
+            self._new_value = self._new_index.values
+
+        if item not in self._new_index:
+            self._new_index.append(freeze(item))
 
         if ignore_old_value() or self._old_value is undefined:
             return True
+        elif isinstance(self._old_value, (list, tuple)):
+            if self._old_index is None:
+                self._old_index = ValueIndex(self._old_value)
+            return item in self._old_index
         else:
             return item in self._old_value
 
     def _new_code(self):
         return self._value_to_code(self._new_value)
 
+    def _fingerprint(self):
+        old_values = ValueIndex(self._old_value)
+        new_values = ValueIndex(self._new_value)
+
+        if any(v not in new_values for v in self._old_value) or any(
+            v not in old_values for v in self._new_value
+        ):
+            return None
+
+        return fingerprint_of(
+            type(self).__name__, repr(self._old_value), repr(self._new_value)
+        )
+
     def _get_changes(self) -> Iterator[Change]:
 
         if self._ast_node is None:
@@ -505,17 +664,23 @@ class CollectionValue(GenericValue):
             assert isinstance(self._ast_node, ast.List)
             elements = self._ast_node.elts
 
+        old_values = ValueIndex(self._old_value)
+        new_values = ValueIndex(self._new_value)
+
         for old_value, old_node in zip(self._old_value, elements):
-            if old_value not in self._new_value:
+            if old_value not in new_values:
                 yield Delete(
                     flag="trim", source=self._source, node=old_node, old_value=old_value
                 )
                 continue
 
             # check for update
+            if old_node is None:
+                continue
+
             new_token = value_to_token(old_value)
 
-            if old_node is not None and self._token_of_node(old_node) != new_token:
+            if self._token_of_node(old_node) != new_token:
                 new_code = self._token_to_code(new_token)
 
                 yield Replace(
@@ -527,20 +692,21 @@ class CollectionValue(GenericValue):
                     new_value=old_value,
                 )
 
-        new_values = [v for v in self._new_value if v not in self._old_value]
-        if new_values:
+        inserted_values = [v for v in self._new_value if v not in old_values]
+        if inserted_values:
             yield ListInsert(
                 flag="fix",
                 source=self._source,
                 node=self._ast_node,
                 position=len(self._old_value),
-                new_code=[self._value_to_code(v) for v in new_values],
-                new_values=new_values,
+                new_code=[self._value_to_code(v) for v in inserted_values],
+                new_values=inserted_values,
             )
 
 
 class DictValue(GenericValue):
     _current_op = "snapshot[key]"
+    _key_positions: Optional[Dict[Any, int]] = None
 
     def __getitem__(self, index):
         global _missing_values
@@ -556,8 +722,11 @@ class DictValue(GenericValue):
         child_node = None
         if self._ast_node is not None:
             assert isinstance(self._ast_node, ast.Dict)
-            if index in old_value:
-                pos = list(old_value.keys()).index(index)
+            if self._key_positions is None:
+                self._key_positions = {key: pos for pos, key in enumerate(old_value)}
+
+            pos = self._key_positions.get(index)
+            if pos is not None:
                 child_node = self._ast_node.values[pos]
 
         if index not in self._new_value:
@@ -580,6 +749,19 @@ class DictValue(GenericValue):
             + "}"
         )
 
+    def _fingerprint(self):
+        if self._old_value.keys() != self._new_value.keys():
+            return None
+
+        fingerprints = [type(self).__name__, repr(list(self._old_value.keys()))]
+        for value in self._new_value.values():
+            fingerprint = value._fingerprint()
+            if fingerprint is None:
+                return None
+            fingerprints.append(fingerprint)
+
+        return fingerprint_of(*fingerprints)
+
     def _get_changes(self) -> Iterator[Change]:
 
         assert self._old_value is not undefined
@@ -673,22 +855,30 @@ def snapshot(obj: Any = undefined) -> Any:
     frame = frame.f_back
     assert frame is not None
 
+    code = frame.f_code
+    key = id(code), frame.f_lasti
+
+    known = snapshots.get(key)
+    if known is not None and known._code is code:
+        return known._value
+
+    # the source is only analyzed the first time this snapshot is called
     expr = Source.executing(frame)
 
     module = inspect.getmodule(frame)
     if module is not None and module.__file__ is not None:
         _files_with_snapshots.add(module.__file__)
 
-    key = id(frame.f_code), frame.f_lasti
+    site = (code.co_filename, code.co_firstlineno, code.co_name, frame.f_lasti)
 
-    if key not in snapshots:
-        node = expr.node
-        if node is None:
-            # we can run without knowing of the calling expression but we will not be able to fix code
-            snapshots[key] = Snapshot(obj, None)
-        else:
-            assert isinstance(node, ast.Call)
-            snapshots[key] = Snapshot(obj, expr)
+    node = expr.node
+    if node is None:
+        # we can run without knowing of the calling expression but we will not be able to fix code
+        snapshots[key] = Snapshot(obj, None, None, site, code)
+    else:
+        assert isinstance(node, ast.Call)
+        # expr is not stored, because it keeps a reference to the frame
+        snapshots[key] = Snapshot(obj, node, expr.source, site, code)
 
     return snapshots[key]._value
 
@@ -706,11 +896,15 @@ def used_externals(tree):
 
 
 class Snapshot:
-    def __init__(self, value, expr):
-        self._expr = expr
-        node = expr.node.args[0] if expr is not None and expr.node.args else None
-        source = expr.source if expr is not None else None
-        self._value = UndecidedValue(value, node, source)
+    def __init__(self, value, node, source, site, code=None):
+        self._node = node
+        # (filename, firstlineno, name, lasti) of the code which called snapshot()
+        self._site = site
+        # the id() of the code is part of the key in `snapshots` and can only
+        # be reused by another code object after this one is deleted
+        self._code = code
+        arg_node = node.args[0] if node is not None and node.args else None
+        self._value = UndecidedValue(value, arg_node, source)
         self._uses_externals = []
 
     def _changes(self):
@@ -724,7 +918,7 @@ class Snapshot:
             yield CallArg(
                 "create",
                 self._value._source,
-                self._expr.node if self._expr is not None else None,
+                self._node,
                 0,
                 None,
                 new_code,
@@ -733,8 +927,36 @@ class Snapshot:
             )
 
         else:
+            value = self._value
+            location = self._fingerprint_location()
+
+            fingerprint = value._fingerprint() if location is not None else None
+
+            if fingerprint is not None and _fingerprints.is_unchanged(
+                *location, fingerprint
+            ):
+                return
+
+            changes = list(value._get_changes())
+
+            if fingerprint is not None and not changes:
+                _fingerprints.set_unchanged(*location, fingerprint)
+
+            yield from changes
+
+    def _fingerprint_location(self) -> Optional[Tuple[str, str]]:
+        """Returns the filename and the position of this snapshot, which are
+        used to store its fingerprint."""
+        node = self._value._ast_node
+        if node is not None:
+            return self._value._source.filename, f"{node.lineno}:{node.col_offset}"
 
-            yield from self._value._get_changes()
+        # the source node is unknown if the assertion is rewritten by pytest,
+        # but the position in the bytecode of the same source is always the same
+        filename, firstlineno, name, lasti = self._site
+        if not os.path.isfile(filename):
+            return None
+        return filename, f"{firstlineno}:{name}:{lasti}"
 
     def _change(self):
         changes = list(self._changes())
@@ -1,9 +1,11 @@
 from __future__ import annotations
 
 import contextlib
+import hashlib
 import logging
+import os
 import pathlib
-import sys
+from bisect import bisect_left
 from collections import defaultdict
 from collections.abc import Iterable
 from dataclasses import dataclass
@@ -14,16 +16,7 @@ import asttokens.util
 from asttokens import LineNumbers
 
 from ._format import format_code
-
-if sys.version_info >= (3, 10):
-    from itertools import pairwise
-else:
-    from itertools import tee
-
-    def pairwise(iterable):  # type: ignore
-        a, b = tee(iterable)
-        next(b, None)
-        return zip(a, b)
+from ._format import merge_line_ranges
 
 
 @dataclass(order=True)
@@ -85,10 +78,89 @@ def range_of(obj):
     return SourceRange(start_of(obj), end_of(obj))
 
 
+def changed_lines(replacements):
+    """Returns the line ranges of the new code which are affected by the
+    sorted `replacements`."""
+
+    lines = []
+    offset = 0
+    for r in replacements:
+        start = r.range.start.lineno
+        end = r.range.end.lineno
+        new_line_count = r.text.count("\n")
+
+        lines.append((start + offset, start + offset + new_line_count))
+
+        offset += new_line_count - (end - start)
+
+    return merge_line_ranges(lines)
+
+
+class Replacements:
+    """The replacements of one file, which are kept sorted by their range.
+
+    Overlapping replacements are detected when they are added, which only
+    needs the neighbours of the new replacement. The insertion order is
+    kept for `truncate()`.
+    """
+
+    def __init__(self):
+        self._keys: list[tuple] = []
+        self._sorted: list[Replacement] = []
+        self._added: list[Replacement] = []
+
+    @staticmethod
+    def _key(r: Replacement) -> tuple:
+        # the same order like the comparison of Replacement, but faster
+        return (
+            r.range.start.lineno,
+            r.range.start.col_offset,
+            r.range.end.lineno,
+            r.range.end.col_offset,
+            r.text,
+            r.change_id,
+        )
+
+    def add(self, replacement: Replacement):
+        key = self._key(replacement)
+        index = bisect_left(self._keys, key)
+
+        if index > 0:
+            lhs = self._sorted[index - 1]
+            assert lhs.range.end <= replacement.range.start, (lhs, replacement)
+
+        if index < len(self._sorted):
+            rhs = self._sorted[index]
+            assert replacement.range.end <= rhs.range.start, (replacement, rhs)
+
+        self._keys.insert(index, key)
+        self._sorted.insert(index, replacement)
+        self._added.append(replacement)
+
+    def truncate(self, length: int):
+        """Removes the replacements which were added after the first
+        `length` ones."""
+        while len(self._added) > length:
+            replacement = self._added.pop()
+            index = bisect_left(self._keys, self._key(replacement))
+            del self._keys[index]
+            del self._sorted[index]
+
+    def __iter__(self):
+        return iter(self._sorted)
+
+    def __len__(self):
+        return len(self._sorted)
+
+
 class UsageError(Exception):
     pass
 
 
+class FileChangedError(Exception):
+    pass
+
+
 class Change:  # ChangeSet
     _next_change_id = 0
 
@@ -121,19 +193,82 @@ class Change:  # ChangeSet
 
     def _replace(self, filename, range, new_contend):
         source = self.change_recorder.get_source(filename)
-        source.replacements.append(
+        source.add_replacement(
             Replacement(range=range, text=new_contend, change_id=self.change_id)
         )
-        source._check()
 
 
 class SourceFile:
+    """The replacements of one file.
+
+    The file is read once. `source` is the code with the replacements which
+    were accepted with `virtual_write()`, `rollback()` removes the
+    replacements which were added after it. `new_code()` is only computed
+    again when the replacements change.
+
+    The file is not written if it was changed by someone else after it was
+    read, or if it differs from the code which was analyzed during the test
+    run (see `expect_code()`).
+    """
+
     def __init__(self, filename):
-        self.replacements: list[Replacement] = []
+        self.replacements = Replacements()
         self.filename = filename
-        self.source = self.filename.read_text("utf-8")
+
+        self._stat = self._file_stat()
+        data = self.filename.read_bytes()
+        self._hash = hashlib.sha256(data).digest()
+
+        # universal newlines like read_text()
+        self.code = data.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+        self.source = self.code
+
+        self._accepted = 0
+        self._new_code: str | None = None
+        self._is_formatted: bool | None = None
+        self._analyzed_code_changed = False
+
+    def add_replacement(self, replacement: Replacement):
+        self.replacements.add(replacement)
+        self._new_code = None
+
+    def _file_stat(self):
+        stat = os.stat(self.filename)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def expect_code(self, code: str):
+        """Remembers that the replacements are based on `code`, the code which
+        was analyzed during the test run.
+
+        The file can not be rewritten if it was changed after it was
+        analyzed, even when this happened before it was read here.
+        """
+        # linecache removes the utf-8 BOM and adds a missing final newline
+        expected = self.code.lstrip("\ufeff")
+        if expected and not expected.endswith("\n"):
+            expected += "\n"
+
+        if code != expected:
+            self._analyzed_code_changed = True
+
+    def check_unchanged(self):
+        """Raises a FileChangedError if the content of the file was changed
+        after it was analyzed or read."""
+        if self._analyzed_code_changed:
+            raise FileChangedError(
+                f"{self.filename} was changed after it was analyzed, the changes were not applied"
+            )
+
+        if self._file_stat() == self._stat:
+            return
+
+        if hashlib.sha256(self.filename.read_bytes()).digest() != self._hash:
+            raise FileChangedError(
+                f"{self.filename} was changed after it was read, the changes were not applied"
+            )
 
     def rewrite(self):
+        self.check_unchanged()
         new_code = self.new_code()
 
         with open(self.filename, "bw") as code:
@@ -141,34 +276,39 @@ class SourceFile:
 
     def virtual_write(self):
         self.source = self.new_code()
+        self._accepted = len(self.replacements)
 
-    def _check(self):
-        replacements = list(self.replacements)
-        replacements.sort()
+    def rollback(self):
+        self.replacements.truncate(self._accepted)
+        self._new_code = self.source
 
-        for r in replacements:
-            assert r.range.start <= r.range.end, r
+    def is_formatted(self) -> bool:
+        if self._is_formatted is None:
+            self._is_formatted = self.code == format_code(self.code, self.filename)
 
-        for lhs, rhs in pairwise(replacements):
-            assert lhs.range.end <= rhs.range.start, (lhs, rhs)
+            if not self._is_formatted:
+                logging.info(f"file is not formatted with black: {self.filename}")
+                import black
 
-    def new_code(self) -> str:
-        """Returns the new file contend or None if there are no replacepents to
-        apply."""
-        replacements = list(self.replacements)
-        replacements.sort()
+                logging.info(f"black version: {black.__version__}")
 
-        self._check()
+        return self._is_formatted
 
-        code = self.filename.read_text("utf-8")
+    def new_code(self) -> str:
+        """Returns the new file contend."""
+        if self._new_code is None:
+            self._new_code = self._compute_new_code()
+        return self._new_code
 
-        is_formatted = code == format_code(code, self.filename)
+    def _compute_new_code(self) -> str:
+        replacements = list(self.replacements)
+
+        code = self.code
 
-        if not is_formatted:
-            logging.info(f"file is not formatted with black: {self.filename}")
-            import black
+        if not replacements:
+            return code
 
-            logging.info(f"black version: {black.__version__}")
+        is_formatted = self.is_formatted()
 
         line_numbers = LineNumbers(code)
 
@@ -185,14 +325,21 @@ class SourceFile:
         )
 
         if is_formatted:
-            new_code = format_code(new_code, self.filename)
+            # the rest of the file is already formatted
+            new_code = format_code(
+                new_code, self.filename, lines=changed_lines(replacements)
+            )
 
         return new_code
 
     def diff(self):
+        new_code = self.new_code()
+        if new_code == self.source:
+            return ""
+
         return "\n".join(
             islice(
-                unified_diff(self.source.splitlines(), self.new_code().splitlines()),
+                unified_diff(self.source.splitlines(), new_code.splitlines()),
                 2,
                 None,
             )
@@ -238,14 +385,32 @@ class ChangeRecorder:
             changes.update(change.change_id for change in file.replacements)
         return len(changes)
 
+    def changed_files(self) -> list[SourceFile]:
+        """Returns the files which have replacements."""
+        return [file for file in self._source_files.values() if file.replacements]
+
     def fix_all(self):
-        for file in self._source_files.values():
+        files = self.changed_files()
+
+        # no file is written if one of them was changed
+        for file in files:
+            file.check_unchanged()
+
+        for file in files:
             file.rewrite()
 
     def virtual_write(self):
+        """Accepts the current replacements. The diffs of the files show only
+        the changes which were made after this call."""
         for file in self._source_files.values():
             file.virtual_write()
 
+    def rollback(self):
+        """Removes the replacements which were made after the last call of
+        `virtual_write()`."""
+        for file in self._source_files.values():
+            file.rollback()
+
     def dump(self):  # pragma: no cover
         for file in self._source_files.values():
             print("file:", file.filename)
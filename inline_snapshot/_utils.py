@@ -1,10 +1,20 @@
 import ast
 import io
+import math
 import token
 import tokenize
 from collections import namedtuple
 
 
+def is_normalized_string(t):
+    """Strings which are normalized to their repr() by `normalize_strings`."""
+    return (
+        t.type == token.STRING
+        and not t.string.startswith(("'''", '"""', "b'''", 'b"""'))
+        and t.string.startswith(("'", '"', "b'", 'b"'))
+    )
+
+
 def normalize_strings(token_sequence):
     """Normalize string concattenanion.
 
@@ -13,11 +23,7 @@ def normalize_strings(token_sequence):
 
     current_string = None
     for t in token_sequence:
-        if (
-            t.type == token.STRING
-            and not t.string.startswith(("'''", '"""', "b'''", 'b"""'))
-            and t.string.startswith(("'", '"', "b'", 'b"'))
-        ):
+        if is_normalized_string(t):
             if current_string is None:
                 current_string = ast.literal_eval(t.string)
             else:
@@ -51,6 +57,14 @@ def normalize(token_sequence):
     return skip_trailing_comma(normalize_strings(token_sequence))
 
 
+def constant_token(t, value):
+    """Returns the normalized token of a constant `value` which is written as
+    the single token `t`."""
+    if is_normalized_string(t):
+        return simple_token(token.STRING, repr(value))
+    return simple_token(t.type, t.string)
+
+
 ignore_tokens = (token.NEWLINE, token.ENDMARKER, token.NL)
 
 
@@ -117,7 +131,46 @@ class simple_token(namedtuple("simple_token", "type,string")):
             return super().__eq__(other)
 
 
+def token_key(tokens):
+    """Returns a hashable key for a token sequence.
+
+    Equal token sequences (see `simple_token.__eq__`) have equal keys.
+    """
+    return tuple(
+        (t.type, t.string.replace("'", '"') if t.type == token.STRING else t.string)
+        for t in tokens
+    )
+
+
+def atom_to_token(value):
+    """Returns the tokens of simple values without the tokenizer or None for
+    other values."""
+    value_type = type(value)
+
+    if value_type is str:
+        if "\n" in value:
+            return None
+        return [simple_token(token.STRING, repr(value))]
+
+    if value_type is int or value_type is float:
+        text = repr(value)
+        if value_type is float and not math.isfinite(value):
+            return None
+        if text.startswith("-"):
+            return [simple_token(token.OP, "-"), simple_token(token.NUMBER, text[1:])]
+        return [simple_token(token.NUMBER, text)]
+
+    if value is None or value is True or value is False:
+        return [simple_token(token.NAME, repr(value))]
+
+    return None
+
+
 def value_to_token(value):
+    tokens = atom_to_token(value)
+    if tokens is not None:
+        return tokens
+
     input = io.StringIO(repr(value))
 
     def map_string(tok):
@@ -140,3 +193,42 @@ def value_to_token(value):
         for t in tokenize.generate_tokens(input.readline)
         if t.type not in ignore_tokens
     ]
+
+
+class ValueIndex:
+    """A list of values with fast membership tests.
+
+    Hashable values are looked up in a dict. Unhashable values (and
+    lookups of unhashable values) fall back to comparisons with ==, like
+    `value in list`.
+    """
+
+    def __init__(self, values=()):
+        self.values = []
+        self._hashable = {}
+        self._unhashable = []
+
+        for value in values:
+            self.append(value)
+
+    def append(self, value):
+        self.values.append(value)
+        try:
+            self._hashable.setdefault(value, None)
+        except TypeError:
+            self._unhashable.append(value)
+
+    def __contains__(self, value):
+        try:
+            if value in self._hashable:
+                return True
+        except TypeError:
+            return value in self.values
+
+        return value in self._unhashable
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __len__(self):
+        return len(self.values)
@@ -0,0 +1,242 @@
+"""Transfers the snapshots from the xdist workers to the controller.
+
+Every worker sends the call sites, old values and new values of its
+snapshots to the controller when its session finishes. The controller
+replays the values of all workers on its own snapshots, which merges them
+like the values of one snapshot in a single process (`==` keeps the first
+value, `<=`/`>=` keep the maximum/minimum and `in` collects all values).
+Workers which compared the same `==` snapshot with different values are
+reported as conflict, because the tests of the other workers can not pass
+with the first value (in a single process the second comparison fails).
+The changes are reported and applied once by the controller.
+
+Values are transferred with pickle. The data can also be stored in JSON
+files with another serialization (see `_changeset`).
+"""
+
+import ast
+import base64
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import Type
+
+from executing import Source
+
+from . import _inline_snapshot
+from ._inline_snapshot import CollectionValue
+from ._inline_snapshot import DictValue
+from ._inline_snapshot import EqValue
+from ._inline_snapshot import GenericValue
+from ._inline_snapshot import MaxValue
+from ._inline_snapshot import MinMaxValue
+from ._inline_snapshot import MinValue
+from ._inline_snapshot import Snapshot
+from ._inline_snapshot import UndecidedValue
+from ._sentinels import undefined
+
+value_types: Dict[str, Type[GenericValue]] = {
+    cls.__name__: cls
+    for cls in (
+        UndecidedValue,
+        EqValue,
+        MinValue,
+        MaxValue,
+        CollectionValue,
+        DictValue,
+    )
+}
+
+# problems with the transfer of snapshots, which are shown in the report
+errors: List[str] = []
+
+# the data of the finished workers, which is merged in the order of the worker ids
+_worker_data: Dict[str, Dict[str, Any]] = {}
+
+_call_nodes: Dict[str, Dict[Tuple[int, ...], ast.Call]] = {}
+
+
+class ConflictError(Exception):
+    pass
+
+
+def dumps(value) -> str:
+    import pickle
+
+    return base64.b64encode(pickle.dumps(value)).decode()
+
+
+def loads(data: str):
+    import pickle
+
+    return pickle.loads(base64.b64decode(data))
+
+
+def dump_value(value: GenericValue, dumps=dumps) -> Dict[str, Any]:
+    data: Dict[str, Any] = {"type": type(value).__name__}
+
+    if isinstance(value, DictValue):
+        data["items"] = [
+            [dumps(key), dump_value(child, dumps)]
+            for key, child in value._new_value.items()
+        ]
+    elif not isinstance(value, UndecidedValue):
+        data["new"] = dumps(value._new_value)
+
+    return data
+
+
+def node_position(node: ast.AST) -> Tuple[int, ...]:
+    return (
+        node.lineno,
+        node.col_offset,
+        node.end_lineno or 0,
+        node.end_col_offset or 0,
+    )
+
+
+def snapshot_location(filename, position, site) -> str:
+    return f"{filename}:{position[0] if position else site[0]}"
+
+
+def dump_snapshots(dumps=dumps, destination="the xdist controller") -> Dict[str, Any]:
+    """Returns the snapshots of this worker in a form which can be sent to
+    the controller.
+
+    The values are serialized with `dumps`.
+    """
+    snapshots = []
+    dump_errors = []
+
+    for snapshot in _inline_snapshot.snapshots.values():
+        filename, *site = snapshot._site
+        position = None if snapshot._node is None else node_position(snapshot._node)
+        old_value = snapshot._value._old_value
+
+        try:
+            snapshots.append(
+                {
+                    "filename": filename,
+                    "site": site,
+                    "position": position and list(position),
+                    "old": None if old_value is undefined else dumps(old_value),
+                    "value": dump_value(snapshot._value, dumps),
+                }
+            )
+        except Exception as e:
+            dump_errors.append(
+                f"{snapshot_location(filename, position, site)}: "
+                f"can not send the snapshot to {destination} ({type(e).__name__}: {e})"
+            )
+
+    return {
+        "snapshots": snapshots,
+        "files": sorted(_inline_snapshot._files_with_snapshots),
+        "errors": dump_errors,
+    }
+
+
+def call_node(filename, position) -> Optional[ast.Call]:
+    if filename not in _call_nodes:
+        tree = Source.for_filename(filename).tree
+        assert tree is not None
+        _call_nodes[filename] = {
+            node_position(node): node
+            for node in ast.walk(tree)
+            if isinstance(node, ast.Call)
+        }
+
+    return _call_nodes[filename].get(tuple(position))
+
+
+def load_value(value: GenericValue, data: Dict[str, Any], loads=loads):
+    cls = value_types[data["type"]]
+
+    if cls is UndecidedValue:
+        return
+
+    if isinstance(value, UndecidedValue):
+        value._change(cls)
+    elif type(value) is not cls:
+        raise TypeError(
+            f"the snapshot is used as {value._current_op!r} and {cls._current_op!r}"
+        )
+
+    if cls is DictValue:
+        for key, child in data["items"]:
+            load_value(value[loads(key)], child, loads)
+        return
+
+    new_value = loads(data["new"])
+
+    # the same operations like in the tests
+    if cls is EqValue:
+        if value._new_value is not undefined and not value._new_value == new_value:
+            raise ConflictError(
+                f"the snapshot was compared with {value._new_value!r} and {new_value!r}"
+            )
+        value.__eq__(new_value)
+    elif cls is CollectionValue:
+        for item in new_value:
+            value.__contains__(item)
+    else:
+        assert isinstance(value, MinMaxValue)
+        value._generic_cmp(new_value)
+
+
+def load_snapshot(data: Dict[str, Any], loads=loads):
+    filename = data["filename"]
+    position = data["position"]
+    site = data["site"]
+
+    key = ("xdist", filename, tuple(position or site))
+
+    if key not in _inline_snapshot.snapshots:
+        old_value = undefined if data["old"] is None else loads(data["old"])
+
+        node = call_node(filename, position) if position is not None else None
+        source = Source.for_filename(filename) if node is not None else None
+
+        _inline_snapshot.snapshots[key] = Snapshot(
+            old_value, node, source, (filename, *site)
+        )
+
+    load_value(_inline_snapshot.snapshots[key]._value, data["value"], loads)
+
+
+def add_worker_data(worker_id: str, data: Dict[str, Any]):
+    _worker_data[worker_id] = data
+
+
+def merge_worker_snapshots():
+    """Merges the snapshots of all finished workers into the snapshots of the
+    controller.
+
+    The result does not depend on the order in which the workers finish.
+    """
+    for worker_id in sorted(_worker_data, key=lambda id: (len(id), id)):
+        load_snapshots(_worker_data.pop(worker_id))
+
+
+def load_snapshots(data: Dict[str, Any], loads=loads):
+    """Merges the snapshots of `data` into the snapshots of this process.
+
+    The values are deserialized with `loads`.
+    """
+    _inline_snapshot._files_with_snapshots.update(data["files"])
+    errors.extend(data["errors"])
+
+    for snapshot_data in data["snapshots"]:
+        try:
+            load_snapshot(snapshot_data, loads)
+        except Exception as e:
+            location = snapshot_location(
+                snapshot_data["filename"],
+                snapshot_data["position"],
+                snapshot_data["site"],
+            )
+            errors.append(
+                f"{location}: can not merge the snapshot ({type(e).__name__}: {e})"
+            )
@@ -1,23 +1,19 @@
-import ast
 import os
 import sys
 from pathlib import Path
 
 import pytest
-from rich import box
-from rich.console import Console
-from rich.panel import Panel
-from rich.prompt import Confirm
-from rich.syntax import Syntax
 
+from . import _changeset
 from . import _config
 from . import _external
 from . import _find_external
+from . import _format
 from . import _inline_snapshot
+from . import _xdist
 from ._change import apply_all
-from ._find_external import ensure_import
-from ._inline_snapshot import used_externals
 from ._rewrite_code import ChangeRecorder
+from ._rewrite_code import FileChangedError
 
 
 def pytest_addoption(parser):
@@ -38,16 +34,26 @@ def pytest_addoption(parser):
         "fix: change snapshots which currently break your tests\n",
     )
 
+    group.addoption(
+        "--inline-snapshot-record",
+        metavar="FILE",
+        dest="inline_snapshot_record",
+        help="write the changes of all snapshots to FILE, "
+        "they can be applied later with `python -m inline_snapshot apply FILE`",
+    )
+
 
 categories = {"create", "update", "trim", "fix"}
 flags = {}
 
+fingerprints_key = "inline-snapshot/fingerprints"
 
-def xdist_running(config):
-    return (
-        hasattr(config.option, "numprocesses")
-        and config.option.numprocesses is not None
-    )
+# the exit status is changed if the changes can not be written
+current_session = None
+
+
+def is_xdist_worker(config):
+    return hasattr(config, "workerinput")
 
 
 def pytest_configure(config):
@@ -66,13 +72,7 @@ def pytest_configure(config):
             f"--inline-snapshot=disable can not be combined with other flags ({', '.join(flags-{'disable'})})"
         )
 
-    if xdist_running(config) and flags - {"disabled", "short-report", "report"}:
-        raise pytest.UsageError(f"inline-snapshot can not be combined with xdist")
-
-    if xdist_running(config):
-        _inline_snapshot._active = False
-
-    elif flags & {"review"}:
+    if flags & {"review"}:
         _inline_snapshot._active = True
 
         _inline_snapshot._update_flags = _inline_snapshot.Flags(
@@ -86,9 +86,20 @@ def pytest_configure(config):
 
     snapshot_path = Path(config.rootpath) / ".inline-snapshot/external"
 
-    _external.storage = _external.DiscStorage(snapshot_path)
+    try:
+        _external.storage = _external.create_storage(
+            snapshot_path,
+            _config.config.storage_layout,
+            _config.config.compression,
+        )
+    except ValueError as e:
+        raise pytest.UsageError(str(e))
 
-    if flags - {"short-report", "disable"}:
+    _format.cache = _format.FormatCache(
+        Path(config.rootpath) / ".inline-snapshot/cache"
+    )
+
+    if flags - {"short-report", "disable"} or config.option.inline_snapshot_record:
 
         # hack to disable the assertion rewriting
         # I found no other way because the hook gets installed early
@@ -96,14 +107,61 @@ def pytest_configure(config):
             e for e in sys.meta_path if type(e).__name__ != "AssertionRewritingHook"
         ]
 
+    if is_xdist_worker(config):
+        # the controller reports and applies the changes of all workers
+        return
+
     _external.storage.prune_new_files()
 
+    # the cacheprovider plugin can be disabled with -p no:cacheprovider
+    if hasattr(config, "cache"):
+        _inline_snapshot._fingerprints = _inline_snapshot.Fingerprints(
+            config.cache.get(fingerprints_key, {})
+        )
+
+
+def pytest_unconfigure(config):
+    if _format.cache is not None:
+        _format.cache.prune()
+
+    if _external.storage is not None:
+        _external.storage.close()
+
+    if (
+        _inline_snapshot._active
+        and hasattr(config, "cache")
+        and not is_xdist_worker(config)
+    ):
+        config.cache.set(fingerprints_key, _inline_snapshot._fingerprints.data())
+
+
+def pytest_sessionstart(session):
+    global current_session
+    current_session = session
 
-@pytest.fixture(autouse=True)
-def snapshot_check():
+
+def pytest_sessionfinish(session):
+    config = session.config
+    if is_xdist_worker(config) and _inline_snapshot._active:
+        config.workeroutput["inline_snapshot"] = _xdist.dump_snapshots()
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_testnodedown(node, error):
+    # called by xdist in the controller when a worker is finished
+    data = getattr(node, "workeroutput", {}).get("inline_snapshot")
+    if data is not None:
+        _xdist.add_worker_data(node.gateway.id, data)
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_runtest_setup(item):
     _inline_snapshot._missing_values = 0
-    yield
 
+
+@pytest.hookimpl(trylast=True)
+def pytest_runtest_teardown(item):
+    # called after the fixtures of the test are torn down
     missing_values = _inline_snapshot._missing_values
 
     if missing_values != 0 and not _inline_snapshot._update_flags.create:
@@ -155,18 +213,23 @@ def pytest_assertrepr_compare(config, op, left, right):
 
 def pytest_terminal_summary(terminalreporter, exitstatus, config):
 
-    if xdist_running(config):
-        terminalreporter.section("inline snapshot")
-        terminalreporter.write(
-            "INFO: inline-snapshot was disabled because you used xdist\n"
-        )
+    if not _inline_snapshot._active or is_xdist_worker(config):
         return
 
-    if not _inline_snapshot._active:
-        return
+    # rich is only needed for the report
+    from rich import box
+    from rich.console import Console
+    from rich.panel import Panel
+    from rich.prompt import Confirm
+    from rich.syntax import Syntax
 
     terminalreporter.section("inline snapshot")
 
+    _xdist.merge_worker_snapshots()
+
+    for error in _xdist.errors:
+        terminalreporter.write(f"ERROR: {error}\n")
+
     capture = config.pluginmanager.getplugin("capturemanager")
 
     # --inline-snapshot
@@ -219,6 +282,19 @@ def pytest_terminal_summary(terminalreporter, exitstatus, config):
         for category in all_categories:
             snapshot_changes[category] += 1
 
+    record_file = config.option.inline_snapshot_record
+    if record_file:
+        number, errors = _changeset.write_changeset(
+            record_file,
+            [change for flag_changes in changes.values() for change in flag_changes],
+            Path(config.rootpath),
+        )
+        terminalreporter.write(
+            f"INFO: {number} changes were recorded in {record_file}\n"
+        )
+        for error in errors:
+            terminalreporter.write(f"ERROR: {error}\n")
+
     capture.suspend_global_capture(in_=True)
     try:
         console = Console(
@@ -271,16 +347,16 @@ def pytest_terminal_summary(terminalreporter, exitstatus, config):
             type(e).__name__ == "AssertionRewritingHook" for e in sys.meta_path
         )
 
-        used_changes = []
-        for flag in ("create", "fix", "trim", "update"):
-            if not changes[flag]:
-                continue
+        # the changes of all categories are recorded incrementally, every file
+        # is read once and only formatted again if its replacements change
+        with ChangeRecorder().activate() as cr:
+            used_changes = False
+            for flag in ("create", "fix", "trim", "update"):
+                if not changes[flag]:
+                    continue
 
-            console.rule(f"[yellow bold]{flag.capitalize()} snapshots")
+                console.rule(f"[yellow bold]{flag.capitalize()} snapshots")
 
-            with ChangeRecorder().activate() as cr:
-                apply_all(used_changes)
-                cr.virtual_write()
                 apply_all(changes[flag])
 
                 for file in cr.files():
@@ -300,25 +376,19 @@ def pytest_terminal_summary(terminalreporter, exitstatus, config):
                         )
 
                 if apply_changes(flag):
-                    used_changes += changes[flag]
-
-        if used_changes:
-            with ChangeRecorder().activate() as cr:
-                apply_all(used_changes)
-
-                for test_file in cr.files():
-                    tree = ast.parse(test_file.new_code())
-                    used = used_externals(tree)
-
-                    if used:
-                        ensure_import(
-                            test_file.filename, {"inline_snapshot": ["external"]}
-                        )
-
-                    for external_name in used:
-                        _external.storage.persist(external_name)
-
-                cr.fix_all()
+                    used_changes = True
+                    cr.virtual_write()
+                else:
+                    cr.rollback()
+
+            if used_changes:
+                try:
+                    _changeset.write_files(cr)
+                except FileChangedError as e:
+                    terminalreporter.write(f"ERROR: {e}\n")
+                    assert current_session is not None
+                    if current_session.exitstatus == pytest.ExitCode.OK:
+                        current_session.exitstatus = pytest.ExitCode.TESTS_FAILED
 
         unused_externals = _find_external.unused_externals()
 
@@ -290,7 +290,11 @@ def set_time(time_machine):
             if not dir.exists():
                 return []
 
-            return sorted(p.name for p in dir.iterdir() if p.name != ".gitignore")
+            return sorted(
+                p.relative_to(dir).as_posix()
+                for p in dir.rglob("*")
+                if p.is_file() and p.name != ".gitignore"
+            )
 
         @property
         def source(self):
@@ -1,6 +1,17 @@
+import random
+import tracemalloc
+
+import pytest
+from dirty_equals import IsInt
+from hypothesis import given
+from hypothesis.strategies import integers
+from hypothesis.strategies import lists
+
+from inline_snapshot import _align
 from inline_snapshot import snapshot
 from inline_snapshot._align import add_x
 from inline_snapshot._align import align
+from inline_snapshot._align import align_matrix
 
 
 def test_align():
@@ -8,3 +19,85 @@ def test_align():
 
     assert align("abbc", "axyc") == snapshot("mddiim")
     assert add_x(align("abbc", "axyc")) == snapshot("mxxm")
+
+
+@pytest.fixture()
+def use_myers(monkeypatch):
+    monkeypatch.setattr(_align, "max_matrix_size", 0)
+
+
+def check_track(track, seq_a, seq_b):
+    a = iter(seq_a)
+    b = iter(seq_b)
+    for c in track:
+        if c == "m":
+            assert next(a) == next(b)
+        elif c == "d":
+            next(a)
+        elif c == "i":
+            next(b)
+        else:
+            assert False
+    assert next(a, None) is None
+    assert next(b, None) is None
+
+
+@given(
+    seq_a=lists(integers(min_value=0, max_value=3), max_size=20),
+    seq_b=lists(integers(min_value=0, max_value=3), max_size=20),
+)
+def test_align_myers(seq_a, seq_b):
+    old_size = _align.max_matrix_size
+    _align.max_matrix_size = 0
+    try:
+        track = align(seq_a, seq_b)
+    finally:
+        _align.max_matrix_size = old_size
+
+    check_track(track, seq_a, seq_b)
+    assert track.count("m") == align_matrix(seq_a, seq_b).count("m")
+
+
+def test_align_myers_examples(use_myers):
+    assert align("abbc", "axyc") == snapshot("mddiim")
+    assert add_x(align([1, 2, 3, 4], [1, 5, 3, 4, 6])) == snapshot("mxmmi")
+
+    # unhashable elements
+    assert align([[1], [2], {3: 4}], [[1], {3: 4}, [5]]) == snapshot("mdmi")
+
+    # unhashable elements can be equal to hashable ones
+    seq_a = ["a"] + [IsInt()] * 120 + ["b"]
+    seq_b = ["c"] + list(range(120)) + ["e", "d"]
+    assert align(seq_a, seq_b) == align_matrix(seq_a, seq_b)
+    assert align(seq_a, seq_b).count("m") == snapshot(120)
+
+
+def test_align_myers_memory():
+    random.seed(0)
+    seq_a = list(range(300))
+    seq_b = list(seq_a)
+    random.shuffle(seq_b)
+
+    tracemalloc.start()
+    try:
+        track = _align.align_myers(seq_a, seq_b)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    check_track(track, seq_a, seq_b)
+    assert track.count("m") == align_matrix(seq_a, seq_b).count("m")
+
+    # the track of every edit would need about 9MB
+    assert peak < 500_000
+
+
+def test_align_large():
+    seq_a = list(range(20_000))
+    seq_b = seq_a[:5000] + [-1] + seq_a[5000:15000] + seq_a[15001:]
+
+    track = align(seq_a, seq_b)
+    check_track(track, seq_a, seq_b)
+    assert track == "m" * 5000 + "i" + "m" * 10000 + "d" + "m" * 4999
+
+    assert align(seq_a, seq_a) == "m" * 20_000
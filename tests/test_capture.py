@@ -0,0 +1,91 @@
+import copy
+import functools
+
+from .utils import snapshot_env
+from inline_snapshot import _capture
+from inline_snapshot import register_freeze
+from inline_snapshot import snapshot
+from inline_snapshot._capture import freeze
+from inline_snapshot._capture import is_immutable
+
+
+def test_is_immutable():
+    assert is_immutable(5)
+    assert is_immutable("abc")
+    assert is_immutable(None)
+    assert is_immutable((1, ("a", b"b"), frozenset({2.5})))
+
+    assert not is_immutable([1])
+    assert not is_immutable((1, [2]))
+    assert not is_immutable(frozenset({(1, object())}))
+
+
+def test_freeze():
+    value = (1, ("a", None))
+    assert freeze(value) is value
+
+    value = [1, {"a": [2]}]
+    frozen = freeze(value)
+    value[1]["a"].append(3)
+    assert frozen == [1, {"a": [2]}]
+
+
+def test_register_freeze(monkeypatch):
+    # the registration should not change the other tests
+    monkeypatch.setattr(_capture, "_freeze", functools.singledispatch(copy.deepcopy))
+
+    class Token:
+        pass
+
+    class SubToken(Token):
+        pass
+
+    register_freeze(Token, lambda value: value)
+
+    token = Token()
+    assert freeze(token) is token
+
+    token = SubToken()
+    assert freeze(token) is token
+
+
+class CountCopies:
+    copies = 0
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        if not isinstance(other, CountCopies):
+            return NotImplemented
+        return self.value == other.value
+
+    def __le__(self, other):
+        if not isinstance(other, CountCopies):
+            return NotImplemented
+        return self.value <= other.value
+
+    def __hash__(self):
+        return hash(self.value)
+
+    def __deepcopy__(self, memo):
+        CountCopies.copies += 1
+        return CountCopies(self.value)
+
+
+def test_copy_only_retained_values():
+    with snapshot_env():
+        CountCopies.copies = 0
+        for _ in range(5):
+            assert CountCopies(1) == snapshot()
+        assert CountCopies.copies == 1
+
+        CountCopies.copies = 0
+        for i in [1, 2, 2, 3]:
+            assert CountCopies(i) <= snapshot()
+        assert CountCopies.copies == 3
+
+        CountCopies.copies = 0
+        for i in [1, 2, 1, 2]:
+            assert CountCopies(i) in snapshot()
+        assert CountCopies.copies == 2
@@ -0,0 +1,273 @@
+from click.testing import CliRunner
+
+from .utils import config
+from .utils import useStorage
+from inline_snapshot import _inline_snapshot
+from inline_snapshot import snapshot
+from inline_snapshot.__main__ import main
+
+
+def apply(project, *args, changesets=("changes.json",)):
+    directory = project._filename.parent
+
+    # the storage and the config of this test run are replaced by the cli
+    with useStorage(None), config():
+        return CliRunner().invoke(
+            main,
+            [
+                "apply",
+                *[str(directory / changeset) for changeset in changesets],
+                "--root",
+                str(directory),
+                *args,
+            ],
+        )
+
+
+def test_record_and_apply(project):
+    project.setup(
+        """\
+def test_a():
+    assert 5 <= snapshot()
+    assert 1 in snapshot([1, 2])
+    assert outsource("a") == snapshot()
+    assert 1 == snapshot(2)
+"""
+    )
+
+    result = project.run("--inline-snapshot-record=changes.json")
+
+    assert result.report == snapshot(
+        """\
+
+INFO: 4 changes were recorded in changes.json
+Error: one snapshot has incorrect values (--inline-snapshot=fix)
+Info: one snapshot can be trimmed (--inline-snapshot=trim)
+Error: one snapshot is missing a value (--inline-snapshot=create)
+You can also use --inline-snapshot=review to approve the changes interactiv
+"""
+    )
+
+    result = apply(project, "--flags=fix,create")
+
+    assert result.output == snapshot(
+        """\
+applied 3 changes
+"""
+    )
+    assert result.exit_code == 0
+
+    assert project.source == snapshot(
+        """\
+from inline_snapshot import external
+
+
+def test_a():
+    assert 5 <= snapshot(5)
+    assert 1 in snapshot([1, 2])
+    assert outsource("a") == snapshot(external("ca978112ca1b*.txt"))
+    assert 1 == snapshot(1)
+"""
+    )
+
+    assert project.storage() == snapshot(
+        ["ca978112ca1bbdcafac231b39a23dc4da786eff8147c4e72b9807785afee48bb.txt"]
+    )
+
+    result = project.run()
+
+    assert result.ret == 0
+
+
+def test_apply_changed_file(project):
+    project.setup(
+        """\
+def test_a():
+    assert 1 == snapshot(2)
+"""
+    )
+
+    project.run("--inline-snapshot-record=changes.json")
+
+    project.setup(
+        """\
+def test_a():
+    assert 1 == snapshot(3)
+"""
+    )
+
+    result = apply(project)
+
+    assert result.output == snapshot(
+        """\
+Error: test_file.py was changed after the changes were recorded
+"""
+    )
+    assert result.exit_code == 1
+
+    assert project.source == snapshot(
+        """\
+def test_a():
+    assert 1 == snapshot(3)
+"""
+    )
+
+
+def test_merge_shards(project):
+    project.setup(
+        """\
+import pytest
+
+@pytest.mark.parametrize("i", [1, 2])
+def test_a(i):
+    assert i in snapshot([1, 2, 3])
+    assert i <= snapshot(0)
+"""
+    )
+
+    project.run("--inline-snapshot-record=shard-1.json", "-k", "1")
+    project.run("--inline-snapshot-record=shard-2.json", "-k", "2")
+
+    snapshots = dict(_inline_snapshot.snapshots)
+
+    result = apply(
+        project, "--flags=fix,trim", changesets=("shard-1.json", "shard-2.json")
+    )
+
+    # the snapshots of this test run are not changed
+    assert _inline_snapshot.snapshots == snapshots
+
+    assert result.output == snapshot(
+        """\
+applied 2 changes
+"""
+    )
+    assert result.exit_code == 0
+
+    assert project.source == snapshot(
+        """\
+import pytest
+
+@pytest.mark.parametrize("i", [1, 2])
+def test_a(i):
+    assert i in snapshot([1, 2])
+    assert i <= snapshot(2)
+"""
+    )
+
+
+def test_merge_conflict(project):
+    project.setup(
+        """\
+import pytest
+
+@pytest.mark.parametrize("i", [1, 2])
+def test_a(i):
+    assert i == snapshot(0)
+"""
+    )
+
+    project.run("--inline-snapshot-record=shard-1.json", "-k", "1")
+    project.run("--inline-snapshot-record=shard-2.json", "-k", "2")
+
+    result = apply(project, changesets=("shard-1.json", "shard-2.json"))
+
+    assert result.output.replace(str(project._filename), "test_file.py") == snapshot(
+        """\
+Error: test_file.py:8: can not merge the snapshot (ConflictError: the snapshot was compared with 1 and 2)
+"""
+    )
+    assert result.exit_code == 1
+
+
+def test_record_unsupported_value(project):
+    project.setup(
+        """\
+import datetime
+
+def test_a():
+    assert datetime.date(2024, 1, 1) == snapshot()
+"""
+    )
+
+    result = project.run("--inline-snapshot-record=changes.json")
+
+    assert result.report.replace(str(project._filename), "test_file.py") == snapshot(
+        """\
+
+INFO: 0 changes were recorded in changes.json
+ERROR: test_file.py:7: can not send the snapshot to the change-set (ValueError: datetime.date(2024, 1, 1) can not be stored, only literals and external() are supported)
+Error: one snapshot is missing a value (--inline-snapshot=create)
+You can also use --inline-snapshot=review to approve the changes interactiv
+"""
+    )
+
+    result = apply(project)
+
+    assert result.output.replace(str(project._filename), "test_file.py") == snapshot(
+        """\
+Error: test_file.py:7: can not send the snapshot to the change-set (ValueError: datetime.date(2024, 1, 1) can not be stored, only literals and external() are supported)
+"""
+    )
+    assert result.exit_code == 1
+
+
+def test_record_dirty_equals(project):
+    project.setup(
+        """\
+from dirty_equals import IsInt
+
+def test_a():
+    assert {"a": 1, "b": 2} == snapshot({"a": IsInt(), "b": 3})
+"""
+    )
+
+    result = project.run("--inline-snapshot-record=changes.json")
+
+    assert result.report.replace(str(project._filename), "test_file.py") == snapshot(
+        """\
+
+INFO: 0 changes were recorded in changes.json
+ERROR: test_file.py:7: can not send the snapshot to the change-set (ValueError: {'a': 1, 'b': 3} contains dirty-equals objects, which can not be stored)
+Error: one snapshot has incorrect values (--inline-snapshot=fix)
+You can also use --inline-snapshot=review to approve the changes interactiv
+"""
+    )
+
+    result = apply(project)
+
+    assert result.exit_code == 1
+    assert project.source == snapshot(
+        """\
+from dirty_equals import IsInt
+
+def test_a():
+    assert {"a": 1, "b": 2} == snapshot({"a": IsInt(), "b": 3})
+"""
+    )
+
+
+def test_apply_does_not_run_code(project):
+    project.setup(
+        """\
+def test_a():
+    assert [1] == snapshot()
+"""
+    )
+
+    project.run("--inline-snapshot-record=changes.json")
+
+    changeset = project._filename.parent / "changes.json"
+    changeset.write_text(
+        changeset.read_text("utf-8").replace('"[1]"', "\"__import__('os').getcwd()\""),
+        "utf-8",
+    )
+
+    result = apply(project)
+
+    assert result.output.replace(str(project._filename), "test_file.py") == snapshot(
+        """\
+Error: test_file.py:7: can not merge the snapshot (ValueError: __import__('os').getcwd() is not a literal)
+"""
+    )
+    assert result.exit_code == 1
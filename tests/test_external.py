@@ -1,9 +1,17 @@
 import ast
+import gzip
+import io
+import subprocess
+import sys
 
 from .utils import raises
+from .utils import useStorage
+from inline_snapshot import _external
 from inline_snapshot import external
 from inline_snapshot import outsource
 from inline_snapshot import snapshot
+from inline_snapshot._external import DiscStorage
+from inline_snapshot._external import SqliteStorage
 from tests.utils import config
 
 
@@ -315,7 +323,11 @@ def test_errors():
     with raises(snapshot("ValueError: suffix has to start with a '.' like '.png'")):
         outsource("test", suffix="blub")
 
-    with raises(snapshot("TypeError: data has to be of type bytes | str")):
+    with raises(
+        snapshot(
+            "TypeError: data has to be of type bytes | str | binary file | Iterable[bytes]"
+        )
+    ):
         outsource(5)
 
     with raises(
@@ -464,3 +476,451 @@ def test_something():
             "8dc140e6fe831481a2005ae152ffe32a9974aa92a260dfbac780d6a87154bb0b-new.txt",
         ]
     )
+
+
+def test_storage_index(tmp_path):
+    storage = DiscStorage(tmp_path / "external")
+
+    assert storage.list() == snapshot(set())
+
+    storage.save("abc1-new.txt", b"1")
+    storage.save("abd2-new.txt", b"2")
+    storage.save("abc3.txt", b"3")
+
+    assert sorted(storage.lookup_all("abc*.txt")) == snapshot(
+        ["abc1-new.txt", "abc3.txt"]
+    )
+    assert sorted(storage.lookup_all("ab*.txt")) == snapshot(
+        ["abc1-new.txt", "abc3.txt", "abd2-new.txt"]
+    )
+    assert storage.lookup_all("abc3.txt") == snapshot({"abc3.txt"})
+    assert storage.lookup_all("abc3.png") == snapshot(set())
+
+    storage.persist("abc1*.txt")
+    storage.remove("abd2*.txt")
+
+    assert sorted(storage.list()) == snapshot(["abc1.txt", "abc3.txt"])
+    assert sorted(p.name for p in (tmp_path / "external").iterdir()) == snapshot(
+        [".gitignore", "abc1.txt", "abc3.txt"]
+    )
+
+    # created by an other process after the index was read
+    (tmp_path / "external" / "abe4.txt").write_bytes(b"4")
+    assert storage.read("abe*.txt") == snapshot(b"4")
+
+    storage.save("abf5-new.txt", b"5")
+    storage.prune_new_files()
+    assert sorted(storage.list()) == snapshot(["abc1.txt", "abc3.txt", "abe4.txt"])
+
+
+def test_sharded_storage(tmp_path):
+    directory = tmp_path / "external"
+    directory.mkdir()
+    (directory / "abcd1.txt").write_bytes(b"legacy")
+
+    storage = DiscStorage(directory, "sharded")
+    storage.save("abcd2-new.txt", b"2")
+    storage.save("bcde3-new.txt", b"3")
+    storage.persist("abcd2*.txt")
+
+    def files():
+        return sorted(
+            p.relative_to(directory).as_posix()
+            for p in directory.rglob("*")
+            if p.is_file() and p.name != ".gitignore"
+        )
+
+    assert files() == snapshot(["ab/cd/abcd2.txt", "abcd1.txt", "bc/de/bcde3-new.txt"])
+    assert storage.read("abcd1*.txt") == snapshot(b"legacy")
+    assert sorted(storage.lookup_all("abcd*.txt")) == snapshot(
+        ["abcd1.txt", "abcd2.txt"]
+    )
+
+    assert storage.migrate("sharded") == snapshot(1)
+    assert files() == snapshot(
+        ["ab/cd/abcd1.txt", "ab/cd/abcd2.txt", "bc/de/bcde3-new.txt"]
+    )
+
+    storage.remove("bcde3*.txt")
+
+    assert storage.migrate("flat") == snapshot(2)
+    assert files() == snapshot(["abcd1.txt", "abcd2.txt"])
+    assert sorted(p.name for p in directory.iterdir()) == snapshot(
+        [".gitignore", "abcd1.txt", "abcd2.txt"]
+    )
+
+    with raises(
+        snapshot(
+            "ValueError: unknown storage layout 'nested' (possible layouts: flat, sharded, sqlite)"
+        )
+    ):
+        DiscStorage(directory, "nested")
+
+
+def test_sharded_storage_config(project):
+    project.pyproject(
+        """\
+[tool.inline-snapshot]
+storage-layout="sharded"
+"""
+    )
+
+    project.setup(
+        """\
+def test_a():
+    assert outsource("test") == snapshot()
+"""
+    )
+
+    project.run("--inline-snapshot=create")
+
+    assert project.storage() == snapshot(
+        ["9f/86/9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08.txt"]
+    )
+
+    project.pyproject("")
+
+    result = subprocess.run(
+        [sys.executable, "-m", "inline_snapshot", "migrate-storage"],
+        cwd=project._filename.parent,
+        capture_output=True,
+        text=True,
+    )
+    assert result.stdout == snapshot(
+        """\
+moved 1 files into the flat layout
+"""
+    )
+
+    assert project.storage() == snapshot(
+        ["9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08.txt"]
+    )
+
+    result = project.run()
+    assert result.ret == 0
+
+
+def test_sqlite_storage(tmp_path):
+    storage = SqliteStorage(tmp_path / "external.sqlite")
+
+    assert storage.list() == snapshot(set())
+    storage.prune_new_files()
+    assert not (tmp_path / "external.sqlite").exists()
+
+    storage.save("abc1-new.txt", b"1")
+    storage.save("abd2-new.txt", b"2")
+    storage.save("abc3.txt", b"3")
+
+    assert sorted(storage.lookup_all("abc*.txt")) == snapshot(
+        ["abc1-new.txt", "abc3.txt"]
+    )
+    assert storage.lookup_all("abc3.png") == snapshot(set())
+    assert storage.read("abd*.txt") == snapshot(b"2")
+
+    storage.persist("abc1*.txt")
+    storage.remove("abd2*.txt")
+    storage.save("abe4-new.txt", b"4")
+    storage.prune_new_files()
+
+    assert sorted(storage.list()) == snapshot(["abc1.txt", "abc3.txt"])
+
+    with raises(snapshot("HashError: hash collision files=['abc1.txt', 'abc3.txt']")):
+        storage.read("abc*.txt")
+
+    with raises(snapshot("HashError: hash 'b*.txt' is not found in the SqliteStorage")):
+        storage.read("b*.txt")
+
+    storage.close()
+
+
+def test_sqlite_storage_config(project):
+    project.pyproject(
+        """\
+[tool.inline-snapshot]
+storage-layout="sqlite"
+"""
+    )
+
+    project.setup(
+        """\
+def test_a():
+    assert outsource("test") == snapshot()
+"""
+    )
+
+    project.run("--inline-snapshot=create")
+
+    assert project.storage() == snapshot([])
+    database = project._filename.parent / ".inline-snapshot" / "external.sqlite"
+    assert sorted(SqliteStorage(database).list()) == snapshot(
+        ["9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08.txt"]
+    )
+
+    result = project.run()
+    assert result.ret == 0
+
+    project.pyproject(
+        """\
+[tool.inline-snapshot]
+storage-layout="sqlite"
+
+[tool.inline-snapshot.compression]
+".txt" = "gzip"
+"""
+    )
+
+    result = project.run()
+    assert result.ret == 4
+    assert result.errlines == snapshot(
+        ["ERROR: the sqlite storage layout does not support compression", ""]
+    )
+
+    project.pyproject(
+        """\
+[tool.inline-snapshot]
+storage-layout="sqlite"
+"""
+    )
+
+    result = subprocess.run(
+        [sys.executable, "-m", "inline_snapshot", "migrate-storage", "--layout=flat"],
+        cwd=project._filename.parent,
+        capture_output=True,
+        text=True,
+    )
+    assert result.stdout == snapshot(
+        """\
+moved 1 files into the flat layout
+"""
+    )
+
+    assert project.storage() == snapshot(
+        ["9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08.txt"]
+    )
+    assert SqliteStorage(database).list() == snapshot(set())
+
+
+def test_outsource_stream(storage):
+    assert outsource(io.BytesIO(b"test")) == snapshot(external("9f86d081884c*.bin"))
+    assert outsource(iter([b"te", b"st"]), suffix=".png") == snapshot(
+        external("9f86d081884c*.png")
+    )
+
+    assert outsource([b"test"]) == outsource(b"test")
+    assert outsource(io.BytesIO(b"test"))._load_value() == snapshot(b"test")
+
+    assert sorted(storage.list()) == snapshot(
+        [
+            "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08-new.bin",
+            "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08-new.png",
+        ]
+    )
+
+    def chunks():
+        yield b"data"
+        raise ValueError("broken stream")
+
+    with raises(snapshot("ValueError: broken stream")):
+        outsource(chunks())
+
+    with raises(snapshot("TypeError: chunks have to be of type bytes")):
+        outsource(["text"])
+
+    with raises(snapshot("ValueError: suffix has to start with a '.' like '.png'")):
+        outsource(io.BytesIO(b"test"), suffix="png")
+
+    # no temporary files are left
+    assert sorted(p.name for p in storage.directory.iterdir()) == snapshot(
+        [
+            ".gitignore",
+            "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08-new.bin",
+            "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08-new.png",
+        ]
+    )
+
+
+def test_outsource_buffers(storage):
+    assert outsource(bytearray(b"test")) == snapshot(external("9f86d081884c*.bin"))
+    assert outsource(memoryview(b"test")) == outsource(b"test")
+
+    # the files of streams get the same permissions as other files
+    outsource(io.BytesIO(b"stream"))
+    outsource(b"bytes")
+    modes = {p.stat().st_mode & 0o777 for p in storage.directory.glob("*-new.bin")}
+    assert modes == {_external.new_file_mode()}
+
+
+def test_outsource_stream_persisted(storage):
+    storage.save(
+        "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08.bin", b"test"
+    )
+
+    assert outsource(io.BytesIO(b"test")) == snapshot(external("9f86d081884c*.bin"))
+    assert sorted(storage.list()) == snapshot(
+        ["9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08.bin"]
+    )
+
+
+def test_outsource_stream_sqlite(tmp_path):
+    storage = SqliteStorage(tmp_path / "external.sqlite")
+
+    with useStorage(storage):
+        assert outsource(io.BytesIO(b"test")) == snapshot(external("9f86d081884c*.bin"))
+
+    assert storage.list() == snapshot(
+        {"9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08-new.bin"}
+    )
+    storage.close()
+
+
+def test_outsource_path(storage, tmp_path):
+    image = tmp_path / "image.png"
+    image.write_bytes(b"test")
+
+    assert outsource(image) == snapshot(external("9f86d081884c*.png"))
+    assert outsource(image, suffix=".bin") == outsource(b"test")
+    assert outsource(image)._load_value() == snapshot(b"test")
+
+    assert sorted(storage.list()) == snapshot(
+        [
+            "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08-new.bin",
+            "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08-new.png",
+        ]
+    )
+
+    with raises(snapshot("ValueError: suffix has to start with a '.' like '.png'")):
+        outsource(image, suffix="png")
+
+
+def test_outsource_path_copy(storage, tmp_path, monkeypatch):
+    monkeypatch.setattr(_external, "reflink", lambda source, target: False)
+
+    data = tmp_path / "data"
+    data.write_bytes(b"test")
+
+    assert outsource(data) == snapshot(external("9f86d081884c*.bin"))
+
+    (stored,) = [p for p in storage.directory.iterdir() if p.name != ".gitignore"]
+    assert not stored.samefile(data)
+
+    # tests often write their output files again in place
+    with open(data, "r+b") as file:
+        file.write(b"new!")
+
+    assert stored.read_bytes() == snapshot(b"test")
+
+
+def test_outsource_path_sqlite(tmp_path):
+    storage = SqliteStorage(tmp_path / "external.sqlite")
+    data = tmp_path / "data.txt"
+    data.write_bytes(b"test")
+
+    with useStorage(storage):
+        assert outsource(data) == snapshot(external("9f86d081884c*.txt"))
+        assert outsource(data)._load_value() == snapshot(b"test")
+
+    storage.close()
+
+
+def test_compressed_storage(tmp_path):
+    directory = tmp_path / "external"
+    storage = DiscStorage(directory, compression={".txt": "gzip", ".log": "lzma"})
+
+    def files():
+        return sorted(
+            p.relative_to(directory).as_posix()
+            for p in directory.rglob("*")
+            if p.is_file() and p.name != ".gitignore"
+        )
+
+    with useStorage(storage):
+        text = outsource("test")
+        log = outsource(iter([b"te", b"st"]), suffix=".log")
+        outsource(b"test")
+
+        # the hash of the uncompressed data
+        assert text == outsource(b"test", suffix=".txt")
+        assert text == snapshot(external("9f86d081884c*.txt"))
+
+        assert text._load_value() == snapshot(b"test")
+        assert log._load_value() == snapshot(b"test")
+
+    assert files() == snapshot(
+        [
+            "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08-new.bin",
+            "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08-new.log.xz",
+            "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08-new.txt.gz",
+        ]
+    )
+    assert sorted(storage.list()) == snapshot(
+        [
+            "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08-new.bin",
+            "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08-new.log",
+            "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08-new.txt",
+        ]
+    )
+
+    storage.persist("9f86*.txt")
+    assert files() == snapshot(
+        [
+            "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08-new.bin",
+            "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08-new.log.xz",
+            "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08.txt.gz",
+        ]
+    )
+
+    # the compressed data does not depend on the time
+    data = (directory / files()[2]).read_bytes()
+    assert gzip.decompress(data) == b"test"
+    assert data[4:8] == b"\0\0\0\0"
+
+    storage = DiscStorage(directory, "sharded", compression={".bin": "bz2"})
+    assert storage.migrate("sharded") == snapshot(3)
+    assert files() == snapshot(
+        [
+            "9f/86/9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08-new.bin.bz2",
+            "9f/86/9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08-new.log",
+            "9f/86/9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08.txt",
+        ]
+    )
+    assert storage.read("9f86*.bin") == storage.read("9f86*.txt") == snapshot(b"test")
+
+    storage.remove("9f86*.log")
+    assert sorted(storage.list()) == snapshot(
+        [
+            "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08-new.bin",
+            "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08.txt",
+        ]
+    )
+
+    with raises(
+        snapshot(
+            "ValueError: unknown compression 'zip' (possible compressions: gzip, bz2, lzma)"
+        )
+    ):
+        DiscStorage(directory, compression={".txt": "zip"})
+
+
+def test_compressed_storage_config(project):
+    project.pyproject(
+        """\
+[tool.inline-snapshot.compression]
+".txt" = "gzip"
+"""
+    )
+
+    project.setup(
+        """\
+def test_a():
+    assert outsource("test") == snapshot()
+"""
+    )
+
+    project.run("--inline-snapshot=create")
+
+    assert project.storage() == snapshot(
+        ["9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08.txt.gz"]
+    )
+
+    result = project.run()
+    assert result.ret == 0
@@ -0,0 +1,181 @@
+import os
+import warnings
+
+import pytest
+from black import main
+from click.testing import CliRunner
+
+from inline_snapshot import _format
+from inline_snapshot import snapshot
+from inline_snapshot._format import format_code
+from inline_snapshot._format import FormatCache
+from inline_snapshot._format import get_formatter
+from inline_snapshot._format import statement_line_ranges
+from inline_snapshot._format import supports_line_ranges
+
+
+def black_cli(text, filename):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+
+        runner = CliRunner(mix_stderr=False)
+        result = runner.invoke(
+            main, ["--stdin-filename", str(filename), "-"], input=text
+        )
+
+    return result.stdout
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "",
+        "\n",
+        "a=1",
+        "a = 1\n",
+        "x=[1,2,\n3]\r\ny = 'a'\r\n",
+        "def f( a ):\n  return a\n",
+        "[1,2,3,]",
+        "this is not python",
+        "5+",
+        "{'a' : 'b'}",
+        "\ufeffa=1\n",
+        "\ufeffa=1\r\n",
+    ],
+)
+def test_same_as_black_cli(tmp_path, text, monkeypatch):
+    monkeypatch.setattr(_format, "cache", None)
+    filename = tmp_path / "test_a.py"
+    assert format_code(text, filename) == black_cli(text, filename)
+
+
+def test_black_config(tmp_path):
+    filename = tmp_path / "test_a.py"
+    code = "x = [1111111111, 2222222222, 3333333333]\n"
+
+    assert format_code(code, filename) == code
+
+    (tmp_path / "pyproject.toml").write_text(
+        """
+[tool.black]
+line-length=20
+skip-string-normalization=true
+""",
+        "utf-8",
+    )
+
+    assert format_code(code, filename) == black_cli(code, filename)
+    assert format_code(code, filename) != code
+    assert format_code("a='b'", filename) == "a = 'b'\n"
+
+    assert get_formatter(filename) is get_formatter(tmp_path / "test_b.py")
+
+
+def test_force_exclude(tmp_path):
+    code = "a=1\n"
+
+    (tmp_path / "pyproject.toml").write_text(
+        """
+[tool.black]
+force-exclude = "excluded"
+exclude = "ignored"
+""",
+        "utf-8",
+    )
+
+    # the cli writes nothing for excluded files, the code is not changed
+    excluded = tmp_path / "excluded" / "test_a.py"
+    assert black_cli(code, excluded) == ""
+    assert format_code(code, excluded) == code
+
+    # exclude does not apply to the stdin filename
+    ignored = tmp_path / "ignored" / "test_a.py"
+    assert format_code(code, ignored) == black_cli(code, ignored) == "a = 1\n"
+
+
+def test_pyi(tmp_path):
+    code = "class A:\n\n    def f(self): ...\n"
+    filename = tmp_path / "test_a.pyi"
+    assert format_code(code, filename) == black_cli(code, filename)
+
+
+def test_format_cache(tmp_path, monkeypatch):
+    cache = FormatCache(tmp_path / "cache")
+    monkeypatch.setattr(_format, "cache", cache)
+
+    filename = tmp_path / "test_a.py"
+
+    assert format_code("a=1", filename) == "a = 1\n"
+    assert [p.name for p in cache.directory.iterdir() if p.name != ".gitignore"]
+
+    def fail(self, text):
+        assert False, "format should not be called for cached code"
+
+    monkeypatch.setattr(_format.Formatter, "format", fail)
+    assert format_code("a=1", filename) == "a = 1\n"
+
+
+def test_format_cache_prune(tmp_path):
+    cache = FormatCache(tmp_path / "cache", max_size=25)
+
+    for i, key in enumerate("abcd"):
+        cache.set(key, "0123456789")
+        os.utime(cache.directory / key, ns=(i * 10**9, i * 10**9))
+
+    # a is the least recently used entry after this
+    assert cache.get("a") == "0123456789"
+    cache.prune()
+
+    assert sorted(p.name for p in cache.directory.iterdir()) == snapshot(
+        [".gitignore", "a", "d"]
+    )
+    assert cache.get("b") is None
+
+
+def test_statement_line_ranges():
+    code = """\
+a = 1
+
+
+@decorator
+def f():
+    return [
+        1,
+    ]
+
+
+b = 2
+"""
+    assert statement_line_ranges(code, [(7, 7)]) == snapshot([(4, 8)])
+    assert statement_line_ranges(code, [(1, 1), (2, 2)]) == snapshot([(1, 2)])
+    assert statement_line_ranges(code, [(2, 3), (11, 11)]) == snapshot(
+        [(2, 3), (11, 11)]
+    )
+
+
+@pytest.mark.skipif(not supports_line_ranges(), reason="requires black>=24.1.0")
+def test_format_lines(tmp_path):
+    filename = tmp_path / "test_a.py"
+    code = """\
+a  =  1
+
+
+def f():
+    return [1,2,
+    3]
+
+
+b  =  2
+"""
+    assert format_code(code, filename, lines=[(5, 5)]) == snapshot(
+        """\
+a  =  1
+
+
+def f():
+    return [1, 2, 3]
+
+
+b  =  2
+"""
+    )
@@ -0,0 +1,42 @@
+import subprocess
+import sys
+
+from inline_snapshot import snapshot
+
+# the time which the import of the plugin may take in addition to pytest,
+# relative to the import time of pytest (which is less dependent on the machine)
+budget = 0.75
+
+
+def import_times(code):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    # import time: self [us] | cumulative | imported package
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "[us]" not in line:
+            _, cumulative, name = line.split("|")
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_lazy_imports():
+    times = import_times("import pytest; import inline_snapshot.pytest_plugin")
+
+    heavy_modules = ["black", "click", "rich", "dirty_equals", "sqlite3"]
+
+    assert [module for module in heavy_modules if module in times] == snapshot([])
+
+
+def test_import_time():
+    def relative_time():
+        times = import_times("import pytest; import inline_snapshot.pytest_plugin")
+        return times["inline_snapshot.pytest_plugin"] / times["pytest"]
+
+    # black and rich alone took longer to import than pytest
+    assert min(relative_time() for _ in range(3)) < budget
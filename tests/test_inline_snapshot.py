@@ -1,17 +1,27 @@
 import ast
+import gc
 import itertools
+import tracemalloc
 from collections import namedtuple
 from contextlib import nullcontext
 
 import pytest
 from hypothesis import given
+from hypothesis.strategies import booleans
+from hypothesis.strategies import floats
+from hypothesis.strategies import integers
+from hypothesis.strategies import none
+from hypothesis.strategies import one_of
 from hypothesis.strategies import text
 
 from .utils import snapshot_env
 from inline_snapshot import _inline_snapshot
 from inline_snapshot import snapshot
 from inline_snapshot._inline_snapshot import Flags
+from inline_snapshot._utils import atom_to_token
 from inline_snapshot._utils import triple_quote
+from inline_snapshot._utils import value_to_token
+from inline_snapshot._utils import ValueIndex
 
 
 def test_snapshot_eq():
@@ -297,6 +307,37 @@ for a in [1,1,1]:
     )
 
 
+def test_nested_comparison(check_update):
+    # unchanged subtrees are skipped, but the changed leaves are still found
+    assert check_update(
+        'assert [{"a": [1, 2], "b": (3, "x")}, 5] == snapshot([{"a": [1, 2], "b": (3, "y")}, 5])',
+        flags="fix",
+    ) == snapshot(
+        'assert [{"a": [1, 2], "b": (3, "x")}, 5] == snapshot([{"a": [1, 2], "b": (3, "x")}, 5])'
+    )
+
+    assert check_update(
+        'assert [{"a": [16, -2.5, None]}] == snapshot([{"a": [0x10, -2.5, None]}])',
+        flags="update",
+    ) == snapshot(
+        'assert [{"a": [16, -2.5, None]}] == snapshot([{"a": [16, -2.5, None]}])'
+    )
+
+    assert check_update(
+        'assert [{"a": "ab"}] == snapshot([{"a": "a" "b"}])',
+        reported_flags="",
+        flags="update",
+    ) == snapshot('assert [{"a": "ab"}] == snapshot([{"a": "a" "b"}])')
+
+
+@given(value=one_of(integers(), floats(), text(), booleans(), none()))
+def test_atom_to_token(value):
+    tokens = atom_to_token(value)
+    if tokens is not None:
+        # the tokenizer is used for lists
+        assert tokens == value_to_token([value])[1:-1]
+
+
 def test_ge(check_update):
     assert check_update("assert 5<=snapshot()", flags="create") == snapshot(
         "assert 5<=snapshot(5)"
@@ -475,6 +516,52 @@ assert 5 in s
     )
 
 
+def test_value_index():
+    index = ValueIndex([1, [2], {"a": 3}, (4, [5])])
+
+    assert 1 in index
+    assert True in index
+    assert [2] in index
+    assert {"a": 3} in index
+    assert (4, [5]) in index
+
+    assert 2 not in index
+    assert [3] not in index
+
+    index.append([3])
+    assert [3] in index
+    assert list(index) == [1, [2], {"a": 3}, (4, [5]), [3]]
+
+
+def test_contains_many_values():
+    comparisons = 0
+
+    class Id:
+        def __init__(self, value):
+            self.value = value
+
+        def __hash__(self):
+            return hash(self.value)
+
+        def __eq__(self, other):
+            nonlocal comparisons
+            comparisons += 1
+            return self.value == other.value
+
+    ids = [Id(i) for i in range(20_000)]
+
+    with snapshot_env():
+        s = snapshot()
+        for value in ids + ids:
+            assert value in s
+
+        (snapshot_value,) = _inline_snapshot.snapshots.values()
+        assert snapshot_value._value._new_value == ids
+
+    # a list would need ~n²/2 comparisons
+    assert comparisons < 4 * len(ids)
+
+
 def test_getitem(check_update):
     assert check_update('assert 5 == snapshot()["test"]', flags="create") == snapshot(
         'assert 5 == snapshot({"test": 5})["test"]'
@@ -556,6 +643,19 @@ assert 5 == s["q"]
     )
 
 
+def test_getitem_many_keys(check_update):
+    keys = ", ".join(f'"k{i}": {i}' for i in range(500))
+    wrong_keys = keys.replace('"k499": 499', '"k499": 0')
+
+    assert (
+        check_update(
+            f"s = snapshot({{{wrong_keys}}})\nfor i in range(500): assert s[f'k{{i}}'] == i",
+            flags="fix",
+        )
+        == f"s = snapshot({{{keys}}})\nfor i in range(500): assert s[f'k{{i}}'] == i"
+    )
+
+
 def test_assert(check_update):
     assert check_update("assert 2 == snapshot(5)", reported_flags="fix")
 
@@ -982,3 +1082,187 @@ These changes will be applied, because you used --inline-snapshot=create
     result = project.run("--inline-snapshot=report")
 
     assert result.report == snapshot("")
+
+
+def test_fingerprints(tmp_path, monkeypatch):
+    filename = tmp_path / "test_a.py"
+    filename.write_text(
+        """\
+from inline_snapshot import snapshot
+
+for _ in range(2):
+    assert [1, 2] == snapshot([1, 2])
+    assert 5 <= snapshot(5)
+    assert 5 in snapshot([5])
+    assert 5 == snapshot({"a": 5})["a"]
+    assert 2 == snapshot(1 + 1)
+""",
+        "utf-8",
+    )
+
+    calls = []
+
+    for cls in (
+        _inline_snapshot.EqValue,
+        _inline_snapshot.MaxValue,
+        _inline_snapshot.CollectionValue,
+        _inline_snapshot.DictValue,
+    ):
+
+        def wrapper(self, get_changes=cls._get_changes):
+            calls.append(type(self).__name__)
+            return get_changes(self)
+
+        monkeypatch.setattr(cls, "_get_changes", wrapper)
+
+    data = {}
+
+    def run():
+        nonlocal data
+        calls.clear()
+        with snapshot_env():
+            _inline_snapshot._fingerprints = _inline_snapshot.Fingerprints(data)
+            exec(compile(filename.read_text("utf-8"), filename, "exec"))
+            flags = [
+                change.flag
+                for s in _inline_snapshot.snapshots.values()
+                for change in s._changes()
+            ]
+            data = _inline_snapshot._fingerprints.data()
+        return flags
+
+    assert run() == snapshot(["update"])
+    assert sorted(calls) == snapshot(
+        ["CollectionValue", "DictValue", "EqValue", "EqValue", "EqValue", "MaxValue"]
+    )
+
+    assert run() == snapshot(["update"])
+    assert calls == snapshot(["EqValue"])
+
+    filename.write_text(filename.read_text("utf-8").replace("(5)", "(6)"), "utf-8")
+
+    assert run() == snapshot(["trim", "update"])
+    assert len(calls) == 6
+
+    # the fingerprints of deleted files are not kept
+    assert list(_inline_snapshot.Fingerprints(data).data()) == [str(filename)]
+    filename.unlink()
+    assert _inline_snapshot.Fingerprints(data).data() == {}
+
+
+def test_fingerprints_short_report(project):
+    project.setup(
+        """\
+def test_a():
+    assert [1, 2] == snapshot([1, 2])
+    assert 5 in snapshot([5])
+    assert 5 == snapshot({"a": 5})["a"]
+"""
+    )
+
+    # counts the snapshots whose changes are computed
+    conftest = project._filename.parent / "conftest.py"
+    conftest.write_text(
+        conftest.read_text("utf-8")
+        + """
+import pytest
+from inline_snapshot import _inline_snapshot
+
+calls = []
+
+for cls in (_inline_snapshot.EqValue, _inline_snapshot.CollectionValue, _inline_snapshot.DictValue):
+    def wrapper(self, get_changes=cls._get_changes):
+        calls.append(type(self).__name__)
+        return get_changes(self)
+    cls._get_changes = wrapper
+
+@pytest.hookimpl(trylast=True)
+def pytest_terminal_summary():
+    print("calls:", sorted(calls))
+""",
+        "utf-8",
+    )
+
+    def calls(result):
+        (line,) = [line for line in result.outlines if line.startswith("calls:")]
+        return line
+
+    result = project.run()
+    assert calls(result) == snapshot(
+        "calls: ['CollectionValue', 'DictValue', 'EqValue', 'EqValue']"
+    )
+
+    result = project.run()
+    assert calls(result) == snapshot("calls: []")
+
+
+def test_snapshots_do_not_keep_frames_alive(tmp_path):
+    filename = tmp_path / "test_a.py"
+    filename.write_text(
+        "from inline_snapshot import snapshot\n\n"
+        + "".join(
+            f"def test_{i}():\n    data = bytearray(10**6)\n    assert 1 == snapshot(1)\n\n"
+            for i in range(50)
+        ),
+        "utf-8",
+    )
+    code = compile(filename.read_text("utf-8"), filename, "exec")
+
+    with snapshot_env():
+        namespace: dict = {}
+        exec(code, namespace)
+
+        tracemalloc.start()
+        try:
+            usage = []
+            for i in range(50):
+                namespace[f"test_{i}"]()
+                if i in (9, 49):
+                    gc.collect()
+                    usage.append(tracemalloc.get_traced_memory()[0])
+        finally:
+            tracemalloc.stop()
+
+        assert len(_inline_snapshot.snapshots) == 50
+
+    # every frame would keep 1MB alive
+    assert (usage[1] - usage[0]) / 40 < 100_000
+
+
+def test_source_is_analyzed_once(monkeypatch):
+    calls = []
+    executing = _inline_snapshot.Source.executing
+
+    def counting_executing(frame):
+        calls.append(frame)
+        return executing(frame)
+
+    monkeypatch.setattr(_inline_snapshot.Source, "executing", counting_executing)
+
+    with snapshot_env():
+        for i in range(5):
+            assert 5 == snapshot(5)
+
+    assert len(calls) == 1
+
+
+def test_snapshot_of_other_code(tmp_path):
+    filename = tmp_path / "test_a.py"
+    filename.write_text(
+        "from inline_snapshot import snapshot\n\ndef test():\n    return snapshot(5)\n",
+        "utf-8",
+    )
+    code = compile(filename.read_text("utf-8"), filename, "exec")
+
+    with snapshot_env():
+        namespace: dict = {}
+        exec(code, namespace)
+
+        value = namespace["test"]()
+        assert namespace["test"]() is value
+
+        # a snapshot of a deleted code object with the same id()
+        (known,) = _inline_snapshot.snapshots.values()
+        known._code = None
+
+        assert namespace["test"]() is not value
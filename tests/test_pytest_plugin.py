@@ -608,3 +608,56 @@ These changes will be applied, because you used --inline-snapshot=fix\
 """
         ),
     )
+
+
+def test_file_changed_during_run(project):
+    project.setup(
+        """\
+def test_a():
+    assert outsource("text") == snapshot()
+
+def test_b():
+    with open(__file__, "a", encoding="utf-8") as file:
+        file.write("# changed\\n")
+"""
+    )
+
+    result = project.run("--inline-snapshot=create")
+
+    assert result.ret == 1
+    assert result.report.replace(str(project._filename), "test_file.py") == snapshot(
+        """\
+
+------------------------------- Create snapshots -------------------------------
++-------------------------------- test_file.py --------------------------------+
+| @@ -4,7 +4,7 @@                                                              |
+|                                                                              |
+|                                                                              |
+|                                                                              |
+|  def test_a():                                                               |
+| -    assert outsource("text") == snapshot()                                  |
+| +    assert outsource("text") == snapshot(external("982d9e3eb996*.txt"))     |
+|                                                                              |
+|  def test_b():                                                               |
+|      with open(__file__, "a", encoding="utf-8") as file:                     |
++------------------------------------------------------------------------------+
+These changes will be applied, because you used --inline-snapshot=create
+ERROR: test_file.py was changed after it was analyzed, the changes were not applied
+"""
+    )
+
+    # the file, the imports and the storage are not changed
+    assert project.source == snapshot(
+        """\
+def test_a():
+    assert outsource("text") == snapshot()
+
+def test_b():
+    with open(__file__, "a", encoding="utf-8") as file:
+        file.write("# changed\\n")
+# changed
+"""
+    )
+    assert project.storage() == snapshot(
+        ["982d9e3eb996f559e633f4d194def3761d909f5a3b647d1a851fead67c32c9d1-new.txt"]
+    )
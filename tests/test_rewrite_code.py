@@ -1,8 +1,14 @@
+import os
+
 import pytest
 
+from inline_snapshot import snapshot
+from inline_snapshot._rewrite_code import changed_lines
 from inline_snapshot._rewrite_code import ChangeRecorder
 from inline_snapshot._rewrite_code import end_of
+from inline_snapshot._rewrite_code import FileChangedError
 from inline_snapshot._rewrite_code import range_of
+from inline_snapshot._rewrite_code import Replacement
 from inline_snapshot._rewrite_code import SourcePosition
 from inline_snapshot._rewrite_code import SourceRange
 from inline_snapshot._rewrite_code import start_of
@@ -51,3 +57,173 @@ def test_rewrite(tmp_path):
 12c345
 """
     )
+
+
+def test_changed_lines():
+    def r(start, end, text):
+        return Replacement(
+            range=SourceRange(SourcePosition(*start), SourcePosition(*end)), text=text
+        )
+
+    assert changed_lines(
+        [r((2, 0), (2, 1), "a\nb"), r((4, 0), (6, 0), ""), r((8, 0), (8, 0), "x")]
+    ) == snapshot([(2, 3), (5, 5), (7, 7)])
+
+
+def test_rollback(tmp_path):
+    file = tmp_path / "file.txt"
+    file.write_text("12345\n", "utf-8")
+
+    with ChangeRecorder().activate() as recorder:
+        recorder.change_set().replace(((1, 0), (1, 1)), "a", filename=file)
+        recorder.virtual_write()
+
+        recorder.change_set().replace(((1, 2), (1, 3)), "b", filename=file)
+        (source,) = recorder.files()
+        assert source.diff() == snapshot(
+            """\
+@@ -1 +1 @@
+
+-a2345
++a2b45\
+"""
+        )
+
+        recorder.rollback()
+        assert source.diff() == snapshot("")
+        assert source.new_code() == snapshot(
+            """\
+a2345
+"""
+        )
+
+        recorder.fix_all()
+
+    assert file.read_text("utf-8") == snapshot(
+        """\
+a2345
+"""
+    )
+
+
+def test_file_changed(tmp_path):
+    file = tmp_path / "file.txt"
+    file.write_text("12345\n", "utf-8")
+    other_file = tmp_path / "other_file.txt"
+    other_file.write_text("12345\n", "utf-8")
+
+    with ChangeRecorder().activate() as recorder:
+        s = recorder.change_set()
+        s.replace(((1, 0), (1, 1)), "a", filename=other_file)
+        s.replace(((1, 0), (1, 1)), "a", filename=file)
+
+        file.write_text("12345\n", "utf-8")
+        os.utime(file, ns=(0, 0))
+
+        # only the modification time was changed
+        recorder.fix_all()
+
+    assert file.read_text("utf-8") == snapshot(
+        """\
+a2345
+"""
+    )
+
+    with ChangeRecorder().activate() as recorder:
+        s = recorder.change_set()
+        s.replace(((1, 0), (1, 1)), "b", filename=other_file)
+        s.replace(((1, 0), (1, 1)), "b", filename=file)
+
+        file.write_text("changed\n", "utf-8")
+
+        with pytest.raises(FileChangedError):
+            recorder.fix_all()
+
+    # no file was written
+    assert other_file.read_text("utf-8") == snapshot(
+        """\
+a2345
+"""
+    )
+    assert file.read_text("utf-8") == snapshot(
+        """\
+changed
+"""
+    )
+
+
+def test_rollback_file_changed(tmp_path):
+    file = tmp_path / "file.txt"
+    file.write_text("12345\n", "utf-8")
+    other_file = tmp_path / "other_file.txt"
+    other_file.write_text("12345\n", "utf-8")
+
+    with ChangeRecorder().activate() as recorder:
+        s = recorder.change_set()
+        s.replace(((1, 0), (1, 1)), "a", filename=file)
+        recorder.virtual_write()
+
+        s.replace(((1, 0), (1, 1)), "b", filename=other_file)
+        recorder.rollback()
+
+        # the file without accepted replacements is not checked or written
+        other_file.write_text("changed\n", "utf-8")
+
+        recorder.fix_all()
+
+    assert file.read_text("utf-8") == snapshot(
+        """\
+a2345
+"""
+    )
+    assert other_file.read_text("utf-8") == snapshot(
+        """\
+changed
+"""
+    )
+
+
+def test_analyzed_code_changed(tmp_path):
+    file = tmp_path / "file.txt"
+    file.write_bytes(b"\xef\xbb\xbf12345")
+
+    with ChangeRecorder().activate() as recorder:
+        s = recorder.change_set()
+        s.replace(((1, 0), (1, 1)), "a", filename=file)
+
+        # the code which is returned by linecache
+        recorder.get_source(file).expect_code("12345\n")
+        recorder.get_source(file).expect_code("old\n")
+
+        with pytest.raises(FileChangedError):
+            recorder.fix_all()
+
+    assert file.read_bytes() == snapshot(b"\xef\xbb\xbf12345")
+
+
+def test_replacement_order(tmp_path):
+    file = tmp_path / "file.txt"
+    file.write_text("12345\n", "utf-8")
+
+    with ChangeRecorder().activate() as recorder:
+        s = recorder.change_set()
+        s.replace(((1, 3), (1, 4)), "d", filename=file)
+        s.insert((1, 3), "c", filename=file)
+        s.replace(((1, 0), (1, 1)), "a", filename=file)
+        s.insert((1, 5), "e", filename=file)
+
+        with pytest.raises(AssertionError):
+            s.replace(((1, 2), (1, 4)), "x", filename=file)
+
+        recorder.virtual_write()
+        s.replace(((1, 1), (1, 2)), "b", filename=file)
+        recorder.rollback()
+        s.replace(((1, 1), (1, 3)), "bb", filename=file)
+
+        recorder.fix_all()
+
+    assert file.read_text("utf-8") == snapshot(
+        """\
+abbcd5e
+"""
+    )
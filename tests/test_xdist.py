@@ -11,29 +11,158 @@ def test_a():
 """
     )
 
-    result = project.run("--inline-snapshot=create", "-n=auto")
+    result = project.run("--inline-snapshot=create", "-n=2")
 
-    assert "\n".join(result.stderr.lines).strip() == snapshot(
-        "ERROR: inline-snapshot can not be combined with xdist"
+    assert result.report == snapshot(
+        """\
+
+------------------------------- Create snapshots -------------------------------
++-------------------------------- test_file.py --------------------------------+
+| @@ -5,4 +5,4 @@                                                              |
+|                                                                              |
+|                                                                              |
+|                                                                              |
+|  def test_a():                                                               |
+| -    assert 1==snapshot()                                                    |
+| +    assert 1==snapshot(1)                                                   |
++------------------------------------------------------------------------------+
+These changes will be applied, because you used --inline-snapshot=create
+"""
+    )
+
+    assert project.source == snapshot(
+        """\
+def test_a():
+    assert 1==snapshot(1)
+"""
     )
 
-    assert result.ret == 4
+    assert result.ret == 0
 
 
-def test_xdist_disabled(project):
+def test_xdist_report(project):
 
     project.setup(
         """\
 
 def test_a():
-    assert 1==snapshot(1)
+    assert 1==snapshot(2)
 """
     )
 
-    result = project.run("-n=auto")
+    result = project.run("-n=2")
 
     assert result.report == snapshot(
-        "INFO: inline-snapshot was disabled because you used xdist"
+        """\
+
+Error: one snapshot has incorrect values (--inline-snapshot=fix)
+You can also use --inline-snapshot=review to approve the changes interactiv
+"""
+    )
+
+    assert result.ret == 1
+
+
+def test_xdist_merge(project):
+
+    project.setup(
+        """\
+import os
+import pytest
+
+worker = int(os.environ["PYTEST_XDIST_WORKER"][2:])
+
+@pytest.mark.parametrize("i", range(3))
+def test_a(i):
+    assert i + worker <= snapshot()
+    assert i + worker in snapshot()
+    assert worker in snapshot()[i % 2]
+    assert outsource(str(worker)) in snapshot()
+"""
     )
 
+    # every worker runs all tests
+    result = project.run("--inline-snapshot=create", "-n=2", "--dist=each")
+
     assert result.ret == 0
+
+    assert project.source == snapshot(
+        """\
+import os
+import pytest
+
+from inline_snapshot import external
+
+worker = int(os.environ["PYTEST_XDIST_WORKER"][2:])
+
+@pytest.mark.parametrize("i", range(3))
+def test_a(i):
+    assert i + worker <= snapshot(3)
+    assert i + worker in snapshot([0, 1, 2, 3])
+    assert worker in snapshot({0: [0, 1], 1: [0, 1]})[i % 2]
+    assert outsource(str(worker)) in snapshot([external("5feceb66ffc8*.txt"), external("6b86b273ff34*.txt")])
+"""
+    )
+
+    assert project.storage() == snapshot(
+        [
+            "5feceb66ffc86f38d952786c6d696c79c2dbc239dd4e91b46729d73a27fb57e9.txt",
+            "6b86b273ff34fce19d6b804eff5a3f5747ada4eaa22f1d49c01e52ddb7875b4b.txt",
+        ]
+    )
+
+
+def test_xdist_transfer_error(project):
+
+    project.setup(
+        """\
+
+def test_a():
+    class Local:
+        pass
+
+    assert Local() == snapshot()
+"""
+    )
+
+    result = project.run("--inline-snapshot=create", "-n=2")
+
+    assert "can not send the snapshot to the xdist controller" in result.report
+
+
+def test_xdist_conflict(project):
+
+    project.setup(
+        """\
+import os
+
+worker = int(os.environ["PYTEST_XDIST_WORKER"][2:])
+
+def test_a():
+    assert worker == snapshot()
+"""
+    )
+
+    result = project.run("--inline-snapshot=create", "-n=2", "--dist=each")
+
+    assert result.report.replace(str(project._filename), "test_file.py") == snapshot(
+        """\
+
+ERROR: test_file.py:9: can not merge the snapshot (ConflictError: the snapshot was compared with 0 and 1)
+------------------------------- Create snapshots -------------------------------
++-------------------------------- test_file.py --------------------------------+
+| @@ -6,4 +6,4 @@                                                              |
+|                                                                              |
+|  worker = int(os.environ["PYTEST_XDIST_WORKER"][2:])                         |
+|                                                                              |
+|  def test_a():                                                               |
+| -    assert worker == snapshot()                                             |
+| +    assert worker == snapshot(0)                                            |
++------------------------------------------------------------------------------+
+These changes will be applied, because you used --inline-snapshot=create
+"""
+    )
+
+    # the value of the first worker is used like in a single process, where
+    # the second comparison fails
+    assert "snapshot(0)" in project.source
@@ -18,6 +18,7 @@ def snapshot_env():
         external.storage,
         inline_snapshot._files_with_snapshots,
         inline_snapshot._missing_values,
+        inline_snapshot._fingerprints,
     )
 
     inline_snapshot.snapshots = {}
@@ -26,6 +27,7 @@ def snapshot_env():
     external.storage = None
     inline_snapshot._files_with_snapshots = set()
     inline_snapshot._missing_values = 0
+    inline_snapshot._fingerprints = inline_snapshot.Fingerprints()
 
     try:
         yield
@@ -37,6 +39,7 @@ def snapshot_env():
             external.storage,
             inline_snapshot._files_with_snapshots,
             inline_snapshot._missing_values,
+            inline_snapshot._fingerprints,
         ) = current
 
 